@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+#
+# batcher.py
+#
+# copyright  F. Nedelec and S. Dmitrieff 2007--2017
+
+"""
+    Run a conversion command on many files in parallel, while conserving file names
+
+Syntax:
+
+    batcher.py COMMAND IN_SUFFIX OUT_SUFFIX [OUT_OPT] [IN_FILES] [MORE_OUT_OPT] [MORE_IN_FILES] [jobs=N] [--force]
+
+    Each file ending with IN_SUFFIX is converted by :
+        COMMAND IN_FILE OUT_OPT OUT_FILE
+    where OUT_FILE is the name of IN_FILE, without its folder and IN_SUFFIX, followed by OUT_SUFFIX.
+    Any other argument is an option, passed to the conversion of all the files that follow it.
+
+    jobs     : number of conversions run in parallel (default : number of cores, minus the current load)
+    --force  : convert all files ; by default, files are only converted if their output is missing
+               or older than the input
+
+    Progress is reported while converting, and batcher.py returns 3 if any conversion failed.
+
+Examples:
+
+    batcher.py convert .jpg .png one.jpg two.jpg -antialias three.jpg -gamma 5 four.jpg
+    batcher.py pdf2ps .pdf .ps *.pdf jobs=16
+"""
+
+try:
+    import sys, os, subprocess, time, shlex
+    from scan import default_jobs
+except ImportError:
+    sys.stderr.write("Error: could not load necessary python modules\n")
+    sys.exit()
+
+out = sys.stderr
+# minimum time between two progress reports, in seconds
+progress_interval = 0.5
+
+#------------------------------------------------------------------------
+
+def make_jobs(command, in_ext, out_ext, args):
+    """
+    return the conversion commands for the files in args, with the options preceding them
+    if several files have the same output, only the last one is converted
+    """
+    jobs = {}
+    options = []
+    for arg in args:
+        if arg.endswith(in_ext):
+            out_name = os.path.basename(arg)[:-len(in_ext)]+out_ext
+            jobs[out_name] = (arg, out_name, shlex.split(command)+[arg]+options+[out_name])
+        else:
+            options.append(arg)
+    return list(jobs.values())
+
+
+def up_to_date(in_name, out_name):
+    """
+    true if out_name exists and is not older than in_name
+    """
+    try:
+        return os.path.getmtime(out_name) >= os.path.getmtime(in_name)
+    except OSError:
+        return False
+
+
+def convert(job):
+    """
+    run one conversion, return its exit status
+    """
+    in_name, out_name, cmd = job
+    try:
+        return subprocess.call(cmd)
+    except Exception as e:
+        out.write("Error: %s : %s\n" % (' '.join(cmd), repr(e)))
+        return -1
+
+
+def run(jobs, njobs):
+    """
+    run all conversions with njobs parallel launchers, reporting progress, return failed jobs
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    failed = []
+    start = time.time()
+    last = start
+    done = 0
+    with ThreadPoolExecutor(njobs) as pool:
+        futures = {pool.submit(convert, job): job for job in jobs}
+        for future in as_completed(futures):
+            done += 1
+            if future.result() != 0:
+                failed.append((futures[future], future.result()))
+            now = time.time()
+            if now-last > progress_interval or done == len(jobs):
+                last = now
+                out.write("\r  %i / %i files converted, %.1f files/s" % (done, len(jobs), done/(now-start)))
+                out.flush()
+    out.write("\n")
+    return failed
+
+
+def main(args):
+    """
+        read command line arguments and process command
+    """
+    njobs = 0
+    force = False
+    rest = []
+    for arg in args:
+        if arg.startswith('jobs='):
+            njobs = int(arg[5:])
+        elif arg == '--force':
+            force = True
+        else:
+            rest.append(arg)
+
+    if len(rest) < 4:
+        out.write("Error: you should specify a command, two suffixes and files to convert\n")
+        return 1
+
+    jobs = make_jobs(rest[0], rest[1], rest[2], rest[3:])
+    todo = [job for job in jobs if force or not up_to_date(job[0], job[1])]
+    out.write("%i files, %i up to date\n" % (len(jobs), len(jobs)-len(todo)))
+    if not todo:
+        return 0
+
+    if njobs < 1:
+        njobs = default_jobs()
+    failed = run(todo, njobs)
+    for job, status in failed:
+        out.write("  Failed (exit status %i): %s\n" % (status, ' '.join(job[2])))
+    if failed:
+        return 3
+    return 0
+
+#------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1]=='help' or sys.argv[1]=='--help':
+        print(__doc__)
+    else:
+        sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Serge Dmitrieff
+# www.biophysics.fr
+
+"""
+# SYNOPSIS
+
+   benchmarks.py compares the fast code paths of the tools with the original ones
+
+# SYNTAX
+
+   python benchmarks.py [BENCHMARK] [OPTIONS]
+
+# BENCHMARKS
+
+    load       : getdata (bulk loader) against getdata_lines (line by line)
+    regression : array2_regression (shared Gram matrix) against one multilinear_regression per column
+    selection  : multilinear_regression with closed-form against lstsq scoring, for growing numbers of variables
+    startup    : import time (python -X importtime) of the command line tools, against a budget in ms
+
+# OPTIONS
+
+    rows     : number of rows of the test data (default 200000)
+    cols     : number of columns of the test data (default 8)
+    obs      : number of observations for regressions (default 1000)
+    vars     : number of variables for regressions (default 40)
+    slack    : factor applied to all startup budgets (default 1), e.g. for slow machines
+
+# EXAMPLES :
+
+            benchmarks.py load rows=1000000
+"""
+
+import sys
+import os
+import time
+import tempfile
+import subprocess
+from numpy import allclose, arange, array_equal, dot, random, zeros
+from import_tools import *
+from statistical_tools import *
+
+
+def timed(fun,*args):
+    t0=time.perf_counter()
+    res=fun(*args)
+    return time.perf_counter()-t0,res
+
+def make_data_file(rows,cols):
+    # A cytosim-like report : a header, comment lines and columns of numbers
+    data=random.rand(rows,cols)
+    fd,fname=tempfile.mkstemp(suffix='.txt')
+    f=os.fdopen(fd,'w')
+    f.write('%% %s\n' %(' '.join('col%s' %i for i in range(cols))))
+    for i in range(0,rows,1000):
+        f.write('%% frame %s\n' %i)
+        f.write(''.join(' '.join('%.17g' %x for x in row)+'\n' for row in data[i:i+1000]))
+    f.close()
+    return fname,data
+
+def bench_load(rows=200000,cols=8,**kwargs):
+    fname,data=make_data_file(rows,cols)
+    # parsing only : nothing is written to the disk cache (~/.cache/splot) for a temporary file
+    import import_tools
+    enabled=import_tools.use_cache
+    set_cache(enabled=False)
+    try:
+        t_old,(A_old,n_old,c_old)=timed(lambda: getdata_lines(getlines(fname)))
+        t_new,(A_new,n_new,c_new)=timed(getdata,fname)
+    finally:
+        set_cache(enabled=enabled)
+        os.remove(fname)
+    if (n_old,c_old)!=(n_new,c_new) or not array_equal(A_old,A_new):
+        raise ValueError('getdata and getdata_lines disagree')
+    print('load %s x %s : getdata_lines %.3f s, getdata %.3f s, speedup x%.1f' %(rows,cols,t_old,t_new,t_old/t_new))
+
+def bench_regression(obs=1000,vars=40,**kwargs):
+    XX=random.standard_normal((obs,vars))
+    def columnwise(XX):
+        results=zeros((vars,vars))
+        for i in range(vars):
+            mask=arange(vars)!=i
+            results[i,mask]=multilinear_regression(XX[:,i],XX[:,mask],scoring='lstsq')[0]
+        return results
+    t_old,R_old=timed(columnwise,XX)
+    t_new,R_new=timed(array2_regression,XX)
+    if not allclose(R_old,R_new):
+        raise ValueError('array2_regression and multilinear_regression disagree')
+    print('regression %s x %s : multilinear_regression %.3f s, array2_regression %.3f s, speedup x%.1f' %(obs,vars,t_old,t_new,t_old/t_new))
+
+def bench_selection(obs=1000,vars=40,**kwargs):
+    nx=5
+    while nx<=vars:
+        XX=random.standard_normal((obs,nx))
+        Y=dot(XX,random.rand(nx))+random.standard_normal(obs)
+        t_old,res_old=timed(lambda: multilinear_regression(Y,XX,scoring='lstsq'))
+        t_new,res_new=timed(lambda: multilinear_regression(Y,XX,scoring='closed'))
+        if not (allclose(res_old[0],res_new[0]) and array_equal(res_old[3],res_new[3])):
+            raise ValueError('closed-form and lstsq scoring disagree')
+        print('selection %s x %s : lstsq %.3f s, closed %.3f s, speedup x%.1f' %(obs,nx,t_old,t_new,t_old/t_new))
+        nx=2*nx
+
+# Import time budgets, in ms
+startup_budgets=[
+    (['splot.py','--help'],50),
+    (['-c','import import_tools'],200),
+    (['-c','import statistical_tools'],200),
+    (['-c','import splot'],400),
+    ]
+
+def import_time(args):
+    # total import time in ms, summed over top-level imports
+    here=os.path.dirname(os.path.abspath(__file__))
+    proc=subprocess.run([sys.executable,'-X','importtime']+args,cwd=here,
+            stdout=subprocess.DEVNULL,stderr=subprocess.PIPE,universal_newlines=True)
+    total=0
+    for line in proc.stderr.splitlines():
+        words=line.split('|')
+        if line.startswith('import time:') and len(words)==3 and not words[2].startswith('  '):
+            try:
+                total+=int(words[1])
+            except ValueError:
+                pass
+    return total/1000.0
+
+def bench_startup(slack=1,**kwargs):
+    failed=0
+    for args,budget in startup_budgets:
+        ms=import_time(args)
+        status='ok'
+        if ms>budget*slack:
+            status='OVER BUDGET'
+            failed=1
+        print('startup %s : %.1f ms (budget %s ms) %s' %(' '.join(args),ms,budget*slack,status))
+    return failed
+
+benchmarks={
+    'load' : bench_load,
+    'regression' : bench_regression,
+    'selection' : bench_selection,
+    'startup' : bench_startup,
+    }
+
+if __name__ == "__main__":
+    args=sys.argv[1:]
+    if '--help' in args:
+        print(__doc__)
+        sys.exit()
+    opts={}
+    names=[]
+    for arg in args:
+        if arg.find('=')>0:
+            key,val=arg.split('=',1)
+            opts[key]=float(val) if val.find('.')>=0 else int(val)
+        else:
+            names.append(arg)
+    if not names:
+        names=list(benchmarks.keys())
+    failed=0
+    for name in names:
+        failed=benchmarks[name](**opts) or failed
+    sys.exit(failed)
@@ -1,12 +1,27 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python
-import math
-from numpy import *
-import subprocess
+from numpy import (append, arange, argsort, array, ascontiguousarray, concatenate, diff, flatnonzero,
+                   frombuffer, fromiter, hstack, load, loadtxt, save, searchsorted, shape, uint8, zeros)
 import os.path
 import sys
 import os
-
+import re
+import io
+import mmap
+import warnings
+import hashlib
+import json
+import tempfile
+from collections import OrderedDict
+from itertools import chain
+
+# Comment markers, and comments matched up to the end of the line
+CC=('#','%')
+_COMMENTS=re.compile(r'[#%][^\n]*')
+# Bytes of a table of decimal numbers : 1 in words, 2 between words, 0 for any other byte
+_TABLE_BYTES=zeros(256,dtype=uint8)
+_TABLE_BYTES[list(b'0123456789+-.eE')]=1
+_TABLE_BYTES[list(b' \t\r\n')]=2
 
 def modulo(k,n):
 	c=0
@@ -20,6 +35,7 @@ def make_exec(fname):
 
 #Runs a unic command and returns the stdout
 def unpy(job):
+	import subprocess
 	proc=subprocess.Popen([job],stdout=subprocess.PIPE)
 	return proc.stdout.readlines()
 
@@ -77,28 +93,16 @@ def clean_name(fname):
 		return fname
 
 # Remove commented lines / line sections
+#  lines are yielded one at a time : lines can be any iterable, e.g. an open file
 def remove_comments(lines):
-	CC=["#","%"]
-	for c in CC:
-		l=len(lines)
-		j=0
-		while l>0 and j<l:
-			k=lines[j].find(c)
-			if k>0:
-				#print "Corrected midle"
-				lines[j]=lines[j][:k]
-				if len(lines[j].split()):
-					j=j+1
-				else:
-					lines.pop(j)
-					l=l-1
-			elif k==0:
-				lines.pop(j)
-				l=l-1
-			else:
-				j=j+1
-				#print "uncorrected"
-	return lines
+	for line in lines:
+		comment=_COMMENTS.search(line)
+		if comment is None:
+			yield line
+		else:
+			line=line[:comment.start()]
+			if line.strip():
+				yield line
 
 
 # Concatenate folder names, being carefull of the "/" at the end
@@ -115,14 +119,14 @@ def clean_line(line):
 	line=line.rstrip("\n")
 	return line
 
-# Remove end-of-lines (\n) for an array of strings
+# Remove end-of-lines (\n) for an iterable of strings, one line at a time
 def clean_lines(lines):
-	for i,line in enumerate(lines):
-		lines[i]=clean_line(line)
-	return lines
+	for line in lines:
+		yield line.rstrip("\n")
 
 #runs a bash line
 def run(job):
+	import subprocess
 	subprocess.call([job],shell=True)
 
 #create a folder with a name name
@@ -169,13 +173,11 @@ def isnum(a):
 # Converts line of space separated value to vector
 def nums(line):
 	words=line.split()
-	re=[]
-	if len(words):
-		for w in words:
-			if isnum(w):
-				re.append(float(w))
-	return re
-	#return map(float,line.split())
+	try:
+		return [float(w) for w in words]
+	except ValueError:
+		# some words are not numbers
+		return [float(w) for w in words if isnum(w)]
 
 # Check if word exists in file
 def isword_file(fname,word):
@@ -183,28 +185,54 @@ def isword_file(fname,word):
 	return isword_lines(lines,word)
 
 
-def make_file_list(part_fname,outro):
-	liste=[]
-	l=len(part_fname)
-	for f in os.listdir('.'):
-		ix=f.find(part_fname)
-		if ix>=0:
-			bli=f.find(outro)
-			if bli>=0:
-				numero=f[ix+l:bli]
-			else:
-				numero=f[ix+l]
-			try:
-				liste.append([int(numero),f])
-			except:
-				print('Could not understand the number %s in file %s' %(numero,f))
-	#we order the list by time stamp
-	return liste
-
-def make_ordered_file_list(part_fname,outro):
-	liste=make_file_list(part_fname,outro)
-	liste.sort(key=lambda tup: tup[0])
-	return liste
+# Numerically sorted index of the files named *part_fname*NUMBER*outro* in a folder
+#  numbers is an int array, names the corresponding file names ;
+#  find(n) returns the name of file number n (or None) by bisection
+class FileIndex:
+	def __init__(self,numbers,names):
+		self.numbers=numbers
+		self.names=names
+
+	def __len__(self):
+		return len(self.names)
+
+	def find(self,n):
+		i=searchsorted(self.numbers,n)
+		if i<len(self.numbers) and self.numbers[i]==n:
+			return self.names[i]
+		return None
+
+	def liste(self):
+		return [[int(n),name] for n,name in zip(self.numbers,self.names)]
+
+_file_indexes={}
+
+# Builds the FileIndex of folder ; indexes are kept until the folder is modified
+def index_files(part_fname,outro,folder='.',cache=True):
+	key=(os.path.abspath(folder),part_fname,outro)
+	mtime=os.stat(folder).st_mtime_ns
+	if cache and key in _file_indexes and _file_indexes[key][0]==mtime:
+		return _file_indexes[key][1]
+	pattern=re.compile(re.escape(part_fname)+r'(\d+)'+re.escape(outro))
+	numbers=[]
+	names=[]
+	for entry in os.scandir(folder):
+		match=pattern.search(entry.name)
+		if match:
+			numbers.append(int(match.group(1)))
+			names.append(entry.name)
+	numbers=array(numbers,dtype=int)
+	order=argsort(numbers,kind='stable')
+	index=FileIndex(numbers[order],[names[i] for i in order])
+	if cache:
+		_file_indexes[key]=(mtime,index)
+	return index
+
+def make_file_list(part_fname,outro,folder='.'):
+	return index_files(part_fname,outro,folder).liste()
+
+def make_ordered_file_list(part_fname,outro,folder='.'):
+	return index_files(part_fname,outro,folder).liste()
 
 def make_prop_dict(fname,key):
 	lines=getlines(fname)
@@ -235,57 +263,526 @@ def getlines(fname):
 	return lines
 
 def getheader(fname):
-	lines=clean_lines(getlines(fname))
-	CC=["#","%"]
-	line=""
+	f=open(fname,'r')
+	line=clean_line(f.readline())
+	f.close()
+	return header_line(line)
+
+# Returns line if it is a header (commented) line
+def header_line(line):
 	for c in CC:
-		if lines[0].find(c)>=0:
-			line=lines[0];
-	return (line)
+		if line.find(c)>=0:
+			return line
+	return ""
 
 def splitheader(fname):
+	if use_cache:
+		cached=cache_load(fname)
+		if cached is not None:
+			return cached[1]
 	head=getheader(fname)
 	if head:
-		return head.split(' ')
+		return head.split()
 	else:
 		return []
 
-# Extract space separatated value array from file
-def getdata_lines(lines):
-	lines=clean_lines(remove_comments(lines))
-	#print lines
-	nl=len(lines)
-	i=0
-	#while ~len(nums(lines[i])) and i<(nl-1):
-	#	i=i+1
-	nc=len(nums(lines[i]))
-	ar=zeros((nl,nc))
-	n=0;
-	for i,line in enumerate(lines):
-		#print line
-		nu=nums(line)
-		l=len(nu)
-		if l:
-			ar[n,0:l]=nu
-			n=n+1
+# Names of the columns, from the words of the header : comment markers are not names
+def column_names(labels):
+	return ' '.join(labels).lstrip(''.join(CC)+' \t').split()
+
+# Index of the columns by name, for a file with nc columns ; the first of duplicate names is used
+def column_index(labels,nc):
+	index={}
+	for i,name in enumerate(column_names(labels)[:nc]):
+		index.setdefault(name,i)
+	return index
+
+# Sorted indices of the columns to load, given as indices or as names from the header of fname
+#  None selects all columns
+def column_selection(fname,columns):
+	if columns is None:
+		return None
+	index=None
+	selection=set()
+	for c in columns:
+		if isinstance(c,str) and not c.isdigit():
+			if index is None:
+				labels=splitheader(fname)
+				index=column_index(labels,len(labels))
+			if c not in index:
+				raise ValueError('No column named %s in file %s' %(c,fname))
+			selection.add(index[c])
+		else:
+			selection.add(int(c))
+	return tuple(sorted(selection))
+
+# Keeps the selected columns of the result of getdata_header ; columns beyond the file are ignored
+def project(data,columns):
+	if columns is None:
+		return data
+	ar,n,nc,labels=data
+	return ar[:,[c for c in columns if c<nc]],n,nc,labels
+
+# Number of words of the first data line of text
+def first_line_width(text):
+	for line in io.StringIO(text):
+		words=_COMMENTS.sub('',line).split()
+		if words:
+			return len(words)
+	return 0
+
+# True if text (without comments) only has decimal numbers, nc on each non-empty line
+#  columns of such a text are the same whether numbered by word or by number, as in nums ;
+#  words and lines are found by their bytes, without splitting the text
+def numeric_table(text,nc):
+	if nc<1:
+		return False
+	if '#' in text or '%' in text:
+		text=_COMMENTS.sub('',text)
+	b=frombuffer(text.encode(),dtype=uint8)
+	kind=_TABLE_BYTES[b]
+	if not kind.all():
+		return False
+	space=kind==2
+	starts=flatnonzero(~space[1:] & space[:-1])+1
+	if len(b) and not space[0]:
+		starts=concatenate(([0],starts))
+	# number of words of each line
+	ends=searchsorted(starts,flatnonzero(b==10))
+	counts=diff(concatenate(([0],ends,[len(starts)])))
+	return bool(((counts==0)|(counts==nc)).all())
+
+# Extract space separatated value array from lines (any iterable of strings, e.g. an open file)
+#  lines go through remove_comments, clean_lines and nums one at a time, and their numbers are
+#  copied into a float array that grows by doubling : no line is kept once it has been parsed
+#  width : number of columns, if known (e.g. from previous lines of the file), instead of the first line
+def getdata_lines(lines,width=None):
+	rows=map(nums,clean_lines(remove_comments(lines)))
+	first=next(rows,None)
+	if first is None:
+		return zeros((0,0)),0,0
+	nc=len(first) if width is None else width
+	ar=zeros((1024,nc))
+	n=0
+	for nu in chain([first],rows):
+		if not nu:
+			continue
+		if len(nu)>nc:
+			raise ValueError('Line longer than the first data line')
+		if n==ar.shape[0]:
+			ar=concatenate((ar,zeros(ar.shape)))
+		ar[n,0:len(nu)]=nu
+		n=n+1
 	return ar[0:n,:],n,nc
 
+# Extract space separated value array from a whole text buffer at once
+#  same output as getdata_lines : comments are stripped and numbers converted
+#  by numpy's parser in a single pass, ragged rows are padded with zeros
+#  if columns (sorted indices) are given, only these columns are converted and returned,
+#  but nc is still the number of columns of the data
+#  width : number of columns, if known (e.g. from previous lines of the file) ; shorter rows are then
+#          padded to width, and longer rows rejected, whatever the first line of text
+def getdata_buffer(text,columns=None,width=None):
+	if columns is not None:
+		# only the columns of a regular table of numbers can be picked by word position
+		nc=first_line_width(text)
+		selection=[c for c in columns if c<nc]
+		if selection and numeric_table(text,nc):
+			try:
+				with warnings.catch_warnings():
+					warnings.simplefilter('ignore')
+					ar=loadtxt(io.StringIO(text),comments=CC,ndmin=2,usecols=selection)
+				if ar.size:
+					return ar,ar.shape[0],nc
+			except ValueError:
+				pass
+		# ragged rows or non-numeric words : all columns are read, and numbered as by nums
+		ar,n,nc=getdata_buffer(text)
+		if n:
+			ar=ar[:,[c for c in columns if c<nc]]
+		return ar,n,nc
+	try:
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore')
+			ar=loadtxt(io.StringIO(text),comments=CC,ndmin=2)
+		if ar.size:
+			return pad_width(ar,ar.shape[0],ar.shape[1],width)
+	except ValueError:
+		# ragged rows or non-numeric words
+		pass
+	words=[line.split() for line in _COMMENTS.sub('',text).split('\n')]
+	words=[w for w in words if w]
+	if not words:
+		return zeros((0,0)),0,0
+	try:
+		flat=array([w for line in words for w in line],dtype=float)
+	except ValueError:
+		# some words are not numbers : slow path, word by word
+		return pad_width(*getdata_lines([' '.join(line) for line in words],width),width)
+	lens=array([len(line) for line in words])
+	nl=len(words)
+	nc=int(lens[0]) if width is None else width
+	if lens.max()>nc:
+		raise ValueError('Line longer than the first data line')
+	ar=zeros((nl,nc))
+	ar[arange(nc)<lens[:,None]]=flat
+	return ar,nl,nc
+
+# Pads the n rows of ar (nc columns) with zeros up to width columns ; wider data is rejected
+def pad_width(ar,n,nc,width):
+	if width is None or nc==width or not n:
+		return ar,n,nc
+	if nc>width:
+		raise ValueError('Line longer than the first data line')
+	return hstack((ar,zeros((n,width-nc)))),n,width
+
 def getdata(fname):
+	return getdata_header(fname)[:3]
+
+# Columns of a data file by name, as a dict of arrays (views of the data array)
+#  columns not named by the header are named by their index ; columns as in getdata_header
+def getdata_columns(fname,columns=None):
+	ar,n,nc,labels=getdata_header(fname,columns)
+	if n<0:
+		return {}
+	names=dict((str(i),i) for i in range(nc))
+	names.update(column_index(labels,nc))
+	selection=column_selection(fname,columns)
+	if selection is None:
+		return dict((name,ar[:,i]) for name,i in names.items())
+	position=dict((c,j) for j,c in enumerate(c for c in selection if c<nc))
+	return dict((name,ar[:,position[i]]) for name,i in names.items() if i in position)
+
+# Same as getdata, also returning the header as in splitheader, from a single read
+#  columns : indices or names of the columns to load (default : all) ; the array then holds
+#            the existing ones in increasing order, the others are never converted
+def getdata_header(fname,columns=None):
 	try:
-		lines=getlines(fname)
-		return getdata_lines(lines)
+		columns=column_selection(fname,columns)
+		cached=getdata_cached(fname,columns)
+		if cached is not None:
+			return cached
+		# stat before reading : a file modified while parsed is never trusted
+		st=os.stat(fname)
+		f=open(fname,'r')
+		text=f.read()
+		f.close()
+		ar,n,nc=getdata_buffer(text,columns)
+		if not n:
+			raise ValueError('No data found')
+		head=header_line(text.split('\n',1)[0])
+		labels=head.split() if head else []
+		if use_cache:
+			cache_store(fname,st,ar,labels,nc,columns)
+		remember(fname,st,(ar,n,nc,labels),columns)
+		return ar,n,nc,labels
+	except:
+		print('Could not load from file %s' %fname)
+		return [],-1,-1,[]
+
+def getdata_job(job):
+	return getdata_header(*job)
+
+# Loads several files with getdata_header, using njobs processes
+#  results are returned in the order of fnames
+#  columns : None, or the columns to load from each file (see getdata_header)
+def getdata_files(fnames,njobs=None,columns=None):
+	if columns is None:
+		columns=[None]*len(fnames)
+	jobs=[(fname,None if cols is None else column_selection(fname,cols)) for fname,cols in zip(fnames,columns)]
+	results={}
+	missing=[]
+	for job in jobs:
+		if job in results or job in missing:
+			continue
+		cached=getdata_cached(*job)
+		if cached is not None:
+			results[job]=cached
+		else:
+			missing.append(job)
+	if njobs is None:
+		njobs=os.cpu_count() or 1
+	if njobs>len(missing):
+		njobs=len(missing)
+	if njobs>1:
+		try:
+			from multiprocessing import Pool, current_process
+			# a worker of a pool (e.g. of splot_batch) cannot have a pool of its own : it loads files one by one
+			if current_process().daemon:
+				njobs=1
+		except ImportError:
+			print('Warning: multiprocessing unavailable')
+			njobs=1
+	if njobs>1:
+		pool=Pool(njobs,initializer=set_cache,initargs=(cache_dir,cache_size,use_cache))
+		try:
+			loaded=pool.map(getdata_job,missing)
+		finally:
+			pool.close()
+			pool.join()
+		for (fname,cols),data in zip(missing,loaded):
+			results[(fname,cols)]=data
+			if data[1]>0:
+				try:
+					remember(fname,os.stat(fname),data,cols)
+				except OSError:
+					pass
+		missing=[]
+	for job in missing:
+		results[job]=getdata_job(job)
+	return [results[job] for job in jobs]
+
+# Incremental reader of a growing data file (e.g. a running simulation)
+#  each call to getdata only parses the lines appended since the previous call ;
+#  a trailing line without end-of-line is left for the next call
+class DataTail:
+	def __init__(self,fname):
+		self.file=fname
+		self.reset()
+
+	def reset(self):
+		self.offset=0
+		self.ino=None
+		self.buf=zeros((0,0))
+		self.n=0
+		self.nc=0
+
+	def getdata(self):
+		f=open(self.file,'rb')
+		try:
+			st=os.fstat(f.fileno())
+			# the file was replaced or truncated : starting over
+			if st.st_ino!=self.ino or st.st_size<self.offset:
+				self.reset()
+				self.ino=st.st_ino
+			f.seek(self.offset)
+			new=f.read()
+		finally:
+			f.close()
+		end=new.rfind(b'\n')+1
+		if end:
+			# appended lines are read with the width of the first data line of the file
+			self.append(*getdata_buffer(new[:end].decode(),width=self.nc or None))
+			self.offset=self.offset+end
+		return self.buf[:self.n],self.n,self.nc
+
+	def append(self,ar,n,c):
+		if not n:
+			return
+		self.nc=c
+		# the buffer grows geometrically so that appending stays O(new data)
+		if self.n+n>self.buf.shape[0]:
+			cap=2*self.buf.shape[0]
+			if cap<self.n+n:
+				cap=self.n+n
+			buf=zeros((cap,self.nc))
+			if self.n:
+				buf[:self.n]=self.buf[:self.n]
+			self.buf=buf
+		self.buf[self.n:self.n+n]=ar
+		self.n=self.n+n
+
+_tails={}
+
+# Same as getdata, but only parses what was appended to fname since the last call
+def getdata_tail(fname):
+	key=os.path.abspath(fname)
+	if key not in _tails:
+		_tails[key]=DataTail(fname)
+	try:
+		return _tails[key].getdata()
 	except:
 		print('Could not load from file %s' %fname)
 		return [],-1,-1
 
-# Extract space separatated value array from file
+# Binary cache of parsed data files
+#  cache_dir  : folder of the .npy sidecars (env. SPLOT_CACHE_DIR)
+#  cache_size : maximum size of the cache in bytes, least recently used files are evicted first
+#               (env. SPLOT_CACHE_SIZE, in MB)
+#  use_cache  : set to False to bypass the cache (env. SPLOT_NOCACHE)
+#  memory_files : number of recently loaded files also kept in memory (for long-lived processes)
+cache_dir=os.environ.get('SPLOT_CACHE_DIR',os.path.join(os.path.expanduser('~'),'.cache','splot'))
+cache_size=int(float(os.environ.get('SPLOT_CACHE_SIZE',1024))*2**20)
+use_cache=not os.environ.get('SPLOT_NOCACHE')
+memory_files=0
+_recent=OrderedDict()
+
+def set_cache(folder=None,size=None,enabled=None,memory=None):
+	global cache_dir,cache_size,use_cache,memory_files
+	if folder is not None:
+		cache_dir=folder
+	if size is not None:
+		cache_size=int(size)
+	if enabled is not None:
+		use_cache=enabled
+	if memory is not None:
+		memory_files=memory
+		while len(_recent)>memory_files:
+			_recent.popitem(last=False)
+
+# Keeps the result of getdata_header for fname (and columns) in memory
+def remember(fname,st,data,columns=None):
+	if memory_files:
+		key=(os.path.abspath(fname),columns)
+		_recent[key]=((st.st_size,st.st_mtime_ns),data)
+		_recent.move_to_end(key)
+		while len(_recent)>memory_files:
+			_recent.popitem(last=False)
+
+# Returns getdata_header(fname,columns) from memory or from the binary cache, None if not cached
+#  the selected columns are taken from all the columns of fname if they are cached
+def getdata_cached(fname,columns=None):
+	try:
+		st=os.stat(fname)
+	except OSError:
+		return None
+	keys=[None] if columns is None else [None,columns]
+	if memory_files:
+		for cols in keys:
+			key=(os.path.abspath(fname),cols)
+			if key in _recent and _recent[key][0]==(st.st_size,st.st_mtime_ns):
+				_recent.move_to_end(key)
+				return project(_recent[key][1],columns if cols is None else None)
+	if use_cache:
+		for cols in keys:
+			cached=cache_load(fname,cols)
+			if cached is not None:
+				ar,header,nc=cached
+				data=(ar,ar.shape[0],nc,header)
+				remember(fname,st,data,cols)
+				return project(data,columns if cols is None else None)
+	return None
+
+# Base name of the sidecar files of fname, or of some of its columns
+def cache_path(fname,columns=None):
+	source=os.path.abspath(fname)
+	if columns is not None:
+		# columns are numbered as by nums (entries keyed by repr(columns) alone were numbered by word)
+		source+=':'+repr(columns)
+	key=hashlib.sha1(source.encode()).hexdigest()
+	return os.path.join(cache_dir,key)
+
+# Returns (memory-mapped array, header, number of columns of the data) if fname is unchanged since cached,
+#  None otherwise
+def cache_load(fname,columns=None):
+	base=cache_path(fname,columns)
+	try:
+		st=os.stat(fname)
+		f=open(base+'.json','r')
+		meta=json.load(f)
+		f.close()
+		if meta['size']!=st.st_size or meta['mtime']!=st.st_mtime_ns:
+			return None
+		# copy-on-write : the data can be modified in memory, without changing the cache
+		ar=load(base+'.npy',mmap_mode='c')
+		# the time stamp of the .json file keeps track of the last use
+		os.utime(base+'.json')
+	except (OSError,ValueError,KeyError):
+		return None
+	return ar,meta['header'],meta.get('nc',ar.shape[1])
+
+# Writes a file through a temporary file of the cache directory, so that no other process sees it half-written
+def cache_write(path,mode,write):
+	fd,tmp=tempfile.mkstemp(dir=cache_dir,suffix='.tmp')
+	try:
+		with os.fdopen(fd,mode) as f:
+			write(f)
+		os.replace(tmp,path)
+	except BaseException:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+		raise
+
+def cache_store(fname,st,ar,header,nc=None,columns=None):
+	base=cache_path(fname,columns)
+	meta={'source':os.path.abspath(fname),'size':st.st_size,'mtime':st.st_mtime_ns,'header':header,
+			'nc':ar.shape[1] if nc is None else nc}
+	try:
+		os.makedirs(cache_dir,exist_ok=True)
+		cache_write(base+'.npy','wb',lambda f:save(f,ascontiguousarray(ar)))
+		cache_write(base+'.json','w',lambda f:json.dump(meta,f))
+		cache_evict()
+	except OSError:
+		print('Warning : could not cache data from file %s' %fname)
+
+# Removes the least recently used sidecars until the cache fits in cache_size
+def cache_evict():
+	entries=[]
+	total=0
+	for entry in os.scandir(cache_dir):
+		if entry.name.endswith('.json'):
+			base=entry.path[:-5]
+			try:
+				size=os.path.getsize(base+'.npy')
+				used=entry.stat().st_mtime
+			except OSError:
+				# removed meanwhile by another process
+				continue
+			entries.append((used,base,size))
+			total=total+size
+	entries.sort()
+	for used,base,size in entries:
+		if total<=cache_size:
+			break
+		for ext in ['.json','.npy']:
+			try:
+				os.remove(base+ext)
+			except OSError:
+				pass
+		total=total-size
+
+# Yields the data of a file by blocks of nrows rows
+#  the file is memory-mapped and parsed by chunks of about chunk bytes,
+#  so that memory stays bounded whatever the size of the file
+def iterdata(fname,nrows=65536,chunk=1<<24):
+	f=open(fname,'rb')
+	try:
+		if not os.fstat(f.fileno()).st_size:
+			return
+		mm=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+	finally:
+		f.close()
+	try:
+		size=len(mm)
+		start=0
+		nc=0
+		pending=[]
+		npend=0
+		while start<size:
+			# chunks end on a line break
+			end=mm.find(b'\n',start+chunk)
+			if end<0:
+				end=size
+			else:
+				end=end+1
+			# all chunks are read with the width of the first data line of the file
+			ar,n,c=getdata_buffer(mm[start:end].decode(),width=nc or None)
+			start=end
+			if not n:
+				continue
+			nc=c
+			pending.append(ar)
+			npend=npend+n
+			while npend>=nrows:
+				block=concatenate(pending)
+				yield block[:nrows]
+				pending=[block[nrows:]]
+				npend=npend-nrows
+		if npend:
+			yield concatenate(pending)
+	finally:
+		mm.close()
+
+# Extract the first number of each line from file
+#  lines are read one at a time and may have any number of words
 def readnumsinlines(fname):
-	lines=clean_lines(remove_comments(getlines(fname)))
-	br=[]
-	for line in lines:
-		nus=nums(line)
-		if len(nus):
-			br=append(br,nus[0])
+	f=open(fname,'r')
+	try:
+		br=fromiter((nu[0] for nu in map(nums,clean_lines(remove_comments(f))) if nu),dtype=float)
+	finally:
+		f.close()
 	return br,len(br)
 
 # Saves data from array
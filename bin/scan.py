@@ -5,22 +5,36 @@
 # copyright  F. Nedelec and S. Dmitrieff 2007--2017
 
 """
-    Execute specified command in given directories, sequentially using a given number of processes
- 
+    Execute specified command in given directories, using a given number of parallel jobs
+
 Syntax:
 
-    scan.py command directory1 [directory2] [directory3] [...] [jobs=N]
-    
+    scan.py command directory1 [directory2] [directory3] [...] [jobs=N] [retry=N] [timings=FILE] [-async] [log=FILE]
+
+    jobs     : number of commands run in parallel
+               (default : number of cores, minus the current load of the machine)
+    retry    : number of times a command that failed is run again (default 0)
+    timings  : file in which the time spent in each directory is kept
+               (default ~/.cache/scan/timings.json, for all commands and directories)
+               directories that took longest in a previous run are started first
+    -async   : run all commands from a single process, and prefix each line of their output
+               with the name of the directory ; many lightweight commands can run concurrently
+    log      : with -async, also write the output of the command in file FILE of each directory
+
+    At the end, the time spent and the exit status of each directory are reported,
+    and scan.py returns 3 if the command failed in any directory.
+
 Example:
-    
+
     scan.py 'play image' run* jobs=2
-    
+    scan.py 'report fiber > fibers.txt' run* jobs=100 -async log=report.log
+
 F. Nedelec, 02.2011, 09.2012, 03.2013, 01.2014, 06.2017
 S. Dmitreff, 06.2017
 """
 
 try:
-    import sys, os, subprocess
+    import sys, os, subprocess, time, json, threading, asyncio, signal, tempfile
 except ImportError:
     sys.stderr.write("Error: could not load necessary python modules\n")
     sys.exit()
@@ -28,31 +42,177 @@ except ImportError:
 executable = 'pwd'
 out = sys.stderr
 njobs = 1
+timings_file = os.path.join(os.path.expanduser('~'), '.cache', 'scan', 'timings.json')
+# size of the chunks of output read from each command with -async
+chunk_size = 65536
+lock = threading.Lock()
 
 #------------------------------------------------------------------------
 
 def execute(path):
     """
-    run executable in specified directory
+    run executable in specified directory, return exit status and time spent
     """
-    os.chdir(path)
-    out.write('-  '*24+path+"\n")
+    with lock:
+        out.write('-  '*24+path+"\n")
+    start = time.time()
     try:
-        subprocess.call(executable, shell=True)
+        status = subprocess.call(executable, shell=True, cwd=path)
     except Exception as e:
-        sys.stderr.write("Error: %s\n" % repr(e));
+        with lock:
+            sys.stderr.write("Error: %s\n" % repr(e));
+        status = -1
+    return status, time.time()-start
+
+
+async def execute_async(path, semaphore, logname=None):
+    """
+    run executable in specified directory, writing its output line by line with a prefix,
+    return exit status and time spent
+    """
+    name = os.path.relpath(path)
+    async with semaphore:
+        start = time.time()
+        log = None
+        proc = None
+        try:
+            if logname:
+                log = open(os.path.join(path, logname), 'wb')
+            proc = await asyncio.create_subprocess_shell(executable, cwd=path, start_new_session=True,
+                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+            # output is read by chunks, as lines may be of any length
+            pending = b''
+            while True:
+                chunk = await proc.stdout.read(chunk_size)
+                if log:
+                    log.write(chunk)
+                pending += chunk
+                lines = pending.split(b'\n')
+                pending = lines.pop()
+                if len(pending) >= chunk_size or (pending and not chunk):
+                    lines.append(pending)
+                    pending = b''
+                for line in lines:
+                    sys.stdout.write(name+': '+line.decode(errors='replace')+'\n')
+                sys.stdout.flush()
+                if not chunk:
+                    break
+            status = await proc.wait()
+        except Exception as e:
+            sys.stderr.write("Error: %s: %s\n" % (name, repr(e)));
+            status = -1
+        finally:
+            if proc and proc.returncode is None:
+                # the command and its children are not left running if reading its output failed
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+            if log:
+                log.close()
+    return status, time.time()-start
+
+
+async def execute_all(paths, njobs, logname=None):
+    """
+    run executable in all paths, with at most njobs commands at the same time
+    """
+    semaphore = asyncio.Semaphore(njobs)
+    return await asyncio.gather(*[execute_async(p, semaphore, logname) for p in paths])
+
+
+def run_threads(paths, njobs, logname=None):
+    """
+    run executable in all paths with njobs parallel launchers
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    # idle launchers take the next directory in the list
+    with ThreadPoolExecutor(njobs) as pool:
+        return list(pool.map(execute, paths))
+
+
+def run_async(paths, njobs, logname=None):
+    return asyncio.run(execute_all(paths, njobs, logname))
+
+
+def default_jobs():
+    """
+    number of cores that are not already busy
+    """
+    cores = os.cpu_count() or 1
+    try:
+        busy = int(os.getloadavg()[0]+0.5)
+    except (AttributeError, OSError):
+        busy = 0
+    if cores-busy < 1:
+        return 1
+    return cores-busy
+
+
+def load_timings(fname):
+    """
+    return the times spent in each directory by previous runs, for each command
+    """
+    try:
+        with open(fname, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
-def execute_queue(queue):
+def save_timings(fname, timings):
     """
-    run executable sequentially in directories specified in paths
+    write the times spent in each directory, replacing the file at once
     """
-    while True:
+    try:
+        folder = os.path.dirname(os.path.abspath(fname))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
         try:
-            arg = queue.get(True, 1)
-            execute(arg)
-        except:
-            break;
+            with os.fdopen(fd, 'w') as f:
+                json.dump(timings, f, indent=1)
+            os.replace(tmp, fname)
+        except OSError:
+            os.remove(tmp)
+            raise
+    except OSError as e:
+        out.write("  Warning: could not save timings (%s)\n" % e)
+
+
+def schedule(paths, njobs, retry=0, run=run_threads, logname=None):
+    """
+    run executable in all paths with njobs parallel jobs,
+    return the exit status and time spent for each path
+    """
+    results = {}
+    todo = paths
+    attempt = 0
+    while todo:
+        for path, res in zip(todo, run(todo, njobs, logname)):
+            results[path] = res
+        todo = [p for p in todo if results[p][0] != 0]
+        if attempt >= retry:
+            break
+        attempt += 1
+        for p in todo:
+            out.write("  Warning: retrying `%s' (exit status %i)\n" % (p, results[p][0]))
+    return results
+
+
+def report(paths, results):
+    """
+    write the time spent and exit status of each directory, return number of failures
+    """
+    failed = 0
+    out.write('-  '*24+"summary\n")
+    for p in paths:
+        status, duration = results[p]
+        if status != 0:
+            failed += 1
+        out.write("%10.2f s  %s  %s\n" % (duration, 'ok    ' if status == 0 else 'FAILED', p))
+    out.write("%i directories, %i failed\n" % (len(paths), failed))
+    return failed
 
 
 def main(args):
@@ -66,7 +226,11 @@ def main(args):
         out.write("Error: you should specify a command to execute\n")
         return 1
 
-    njobs = 1
+    njobs = 0
+    retry = 0
+    fname = timings_file
+    run = run_threads
+    logname = None
     paths = []
     for arg in args[1:]:
         if os.path.isdir(arg):
@@ -75,6 +239,14 @@ def main(args):
             njobs = int(arg[6:])
         elif arg.startswith('jobs='):
             njobs = int(arg[5:])
+        elif arg.startswith('retry='):
+            retry = int(arg[6:])
+        elif arg.startswith('timings='):
+            fname = arg[8:]
+        elif arg == '-async':
+            run = run_async
+        elif arg.startswith('log='):
+            logname = arg[4:]
         else:
             out.write("  Warning: unexpected argument `%s'\n" % arg)
             sys.exit()
@@ -82,28 +254,26 @@ def main(args):
     if not paths:
         out.write("Error: you should specify at least one directory\n")
         return 2
-    
+
+    if njobs < 1:
+        njobs = default_jobs()
     if njobs > len(paths):
         njobs = len(paths)
-    
-    #process in parallel with child threads:
-    if njobs > 1:
-        try:
-            from multiprocessing import Process, Queue
-            queue = Queue()
-            for p in paths:
-                queue.put(p)
-            jobs = [Process(target=execute_queue, args=(queue,)) for n in range(njobs)]
-            for job in jobs:
-                job.start()
-            for job in jobs:
-                job.join()
-            return 0
-        except ImportError:
-            out.write("Warning: multiprocessing unavailable\n")
-    #process sequentially:
-    for p in paths:
-        execute(p)
+
+    # longest directories first, unknown ones before all others
+    timings = load_timings(fname)
+    previous = timings.get(executable, {})
+    order = sorted(paths, key=lambda p: -previous.get(p, float('inf')))
+
+    if logname and run is not run_async:
+        out.write("  Warning: log files are only written with -async\n")
+    results = schedule(order, njobs, retry, run, logname)
+
+    previous.update((p, results[p][1]) for p in paths)
+    timings[executable] = previous
+    save_timings(fname, timings)
+    if report(paths, results):
+        return 3
     return 0
 
 #------------------------------------------------------------------------
@@ -112,4 +282,4 @@ if __name__ == "__main__":
     if len(sys.argv) < 2 or sys.argv[1]=='help' or sys.argv[1]=='--help':
         print(__doc__)
     else:
-        main(sys.argv[1:])
+        sys.exit(main(sys.argv[1:]))
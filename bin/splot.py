@@ -5,13 +5,6 @@
 # www.biophysics.fr
 #
 # Based on Python Pyx
-from pyx import *
-from numpy import *
-from pyx.graph import axis
-from import_tools import *
-
-
-
 """
 # SYNOPSIS
 
@@ -42,14 +35,21 @@ from import_tools import *
         ymax          : max y value
         key           : position of figure legend
         out           : name of output file
+        jobs          : number of processes used to load data files (default : number of cores)
         -ylog         : y axis is logarithmic
         -xlog         : x axis is logarithmic
         -keep         : keep options for subsequent plots, until -discard
         -discard      : discard options for next plot
+        -nocache      : do not use the binary cache of parsed data files
+                        (the cache is set by environment variables SPLOT_CACHE_DIR, SPLOT_CACHE_SIZE in MB, SPLOT_NOCACHE)
 
     Local options :
         x        : index of column or row to be used as x axis values (e.g. x=0 for the first column)
                         also can specify an operation : x=A[:,0]*A[:,1]
+                        in vertical mode, columns can also be named from the header of the file, e.g. x=time
+                        or y=length/time if the first line of the file is '% time length'
+                        names that are already defined (A, B, X, Y, pi, mean... or a color, for color=)
+                        keep their meaning : such columns are given by their index
         y        : index of column or row to be used as y axis values (e.g. x=0 for the first column)
                         also can specify an operation : y=A[:,1]*A[:,2]/A[:,3]
         dy       : index of column or row to be used as dy values (e.g. x=0 for the first column)
@@ -60,18 +60,29 @@ from import_tools import *
                         or color.cmyk.*  or color.rgb.*
                         or an operation, e.g. color=A[:,2]
 
+        levels   : number of levels of the color gradient, when color is an operation (default 256)
+
         style    : style of plot : - or _ for a line, -- for dashed, .- for dashdotted
                                     o for circles  x , * for crosses  + for plus   > , <     for triangles
+                                    density for a bitmap of the number of points, colored with the gradient
         if       : condition to keep the rows or columns
 
         range    : range of rows / columns to plot
 
         size     : size of symbol used
 
+        decimate : reduce the number of points drawn, based on axes ranges and figure size
+                        minmax : keeps the first, last, min and max points of each pixel column (for lines)
+                        thin   : keeps one point per small cell of the figure and color level (for symbols)
+                        auto   : minmax for lines, thin for symbols
+
         line     : thickness of line, from 0 to 5
 
         title (or legend) : title of the graph
 
+    Expressions (x=, y=, dx=, dy=, if=, color=, size=) are compiled once and evaluated on the filtered data ;
+        arithmetic expressions of columns A[:,i] or rows A[i,:] are evaluated by numexpr if it is installed
+
 # EXAMPLES :
 
             splot.py file.txt
@@ -103,6 +114,22 @@ from import_tools import *
                         plots the third and fourth column as a function of the second
 """
 
+import sys
+if __name__ == "__main__" and (len(sys.argv)<2 or sys.argv[1]=='--help'):
+    # help needs neither PyX nor numpy
+    print(__doc__)
+    sys.exit()
+
+from pyx import bitmap, color, deco, graph, style, unit
+from pyx.graph import axis
+from numpy import (arange, array, ascontiguousarray, ceil, clip, concatenate, cumsum, errstate, floor,
+                   histogram2d, isfinite, lexsort, log1p, log10, nan_to_num, ravel, searchsorted, sort, stack,
+                   uint8, unique, zeros)
+from import_tools import *
+import ast
+from functools import lru_cache
+
+
 # Basic set of colours
 colours=[color.gray(0.0),color.gray(0.5),color.rgb.red,color.rgb.blue]
 symbols=[graph.style.symbol.plus,graph.style.symbol.circle,graph.style.symbol.cross,graph.style.symbol.triangle]
@@ -159,6 +186,231 @@ grad_dict={
 
 __SPLIT_MARK__ = '--split_mark--'
 
+# Resolution of decimation : pixels per cm for lines, cell size (cm) and color levels for symbols
+decimate_dpcm=300/2.54
+thin_cell=0.03
+thin_levels=8
+# Default number of levels of color gradients
+color_levels=256
+# Resolution of density bitmaps, in pixels per cm
+density_dpcm=150/2.54
+
+# Functions that numexpr can evaluate in column expressions
+numexpr_funcs=['sqrt','exp','log','log10','sin','cos','tan','arcsin','arccos','arctan','arctan2',
+               'sinh','cosh','tanh','abs','where']
+# Operators that numexpr can evaluate (not //, @ or ^ for instance)
+numexpr_ops=(ast.Add,ast.Sub,ast.Mult,ast.Div,ast.Pow,ast.Mod,ast.BitAnd,ast.BitOr,ast.LShift,ast.RShift,
+             ast.UAdd,ast.USub,ast.Invert,ast.Eq,ast.NotEq,ast.Lt,ast.LtE,ast.Gt,ast.GtE)
+
+@lru_cache(maxsize=None)
+def compile_expression(expr):
+    # Column expressions (x=, y=, if=, color=...) are compiled only once
+    tree=ast.parse(expr.strip(),mode='eval')
+    for node in ast.walk(tree):
+        if isinstance(node,ast.Attribute) and node.attr.startswith('_'):
+            raise ValueError('Forbidden attribute %s in %s' %(node.attr,expr))
+    return compile(tree,'<%s>' %expr,'eval')
+
+@lru_cache(maxsize=None)
+def numexpr_form(expr):
+    # Rewrites an arithmetic expression of columns A[:,i] / rows A[i,:] for numexpr
+    #  returns the rewritten expression and its variables, or None if numexpr cannot evaluate it
+    refs={}
+    class Columns(ast.NodeTransformer):
+        def visit_Subscript(self,node):
+            if (isinstance(node.value,ast.Name) and node.value.id=='A'
+                    and isinstance(node.slice,ast.Tuple) and len(node.slice.elts)==2):
+                a,b=node.slice.elts
+                full=lambda s: isinstance(s,ast.Slice) and s.lower is None and s.upper is None and s.step is None
+                index=lambda s: isinstance(s,ast.Constant) and type(s.value) is int and s.value>=0
+                if full(a) and index(b):
+                    name='c%d' %b.value
+                    refs[name]=(1,b.value)
+                    return ast.Name(id=name,ctx=ast.Load())
+                if index(a) and full(b):
+                    name='r%d' %a.value
+                    refs[name]=(0,a.value)
+                    return ast.Name(id=name,ctx=ast.Load())
+            return node
+    tree=Columns().visit(ast.parse(expr.strip(),mode='eval'))
+    allowed=(ast.Expression,ast.BinOp,ast.UnaryOp,ast.Compare,ast.Load)+numexpr_ops
+    for node in ast.walk(tree):
+        if isinstance(node,ast.Call):
+            if not (isinstance(node.func,ast.Name) and node.func.id in numexpr_funcs) or node.keywords:
+                return None
+        elif isinstance(node,ast.Name):
+            if node.id not in refs and node.id not in numexpr_funcs:
+                return None
+        elif isinstance(node,ast.Constant):
+            if type(node.value) not in [int,float]:
+                return None
+        elif not isinstance(node,allowed):
+            return None
+    if not refs:
+        return None
+    return ast.unparse(tree),refs
+
+@lru_cache(maxsize=None)
+def expression_globals():
+    # expressions can use all of numpy, e.g. sqrt(A[:,1])
+    import numpy
+    names=dict(globals())
+    names.update(vars(numpy))
+    try:
+        # optional : fused evaluation of arithmetic column expressions
+        import numexpr
+        names['__numexpr__']=numexpr
+    except ImportError:
+        pass
+    return names
+
+def evaluate(expr,names):
+    # Evaluates a column expression given the values of names (A, X, Y...)
+    namespace=expression_globals()
+    if '__numexpr__' in namespace and 'A' in names:
+        fused=numexpr_form(expr)
+        if fused is not None:
+            A=names['A']
+            columns=dict((name,A[:,i] if ax else A[i,:]) for name,(ax,i) in fused[1].items())
+            try:
+                return namespace['__numexpr__'].evaluate(fused[0],local_dict=columns)
+            except Exception:
+                # e.g. types or operations numexpr does not support : evaluated by numpy
+                pass
+    return eval(compile_expression(expr),namespace,names)
+
+@lru_cache(maxsize=None)
+def defined_names():
+    # Names that keep their meaning in expressions, even if a column of the header has the same name
+    return frozenset(expression_globals())|frozenset(['A','B','X','Y'])
+
+def is_color(col):
+    # True if col is a color of col_dict or a PyX color, e.g. red or rgb.red
+    if col in col_dict:
+        return True
+    try:
+        return isinstance(eval(col if col.startswith('color.') else 'color.%s' %col),color.color)
+    except Exception:
+        return False
+
+@lru_cache(maxsize=None)
+def named_expression(expr,names):
+    # Replaces the column names (name,index) in expression by the columns A[:,index]
+    #  names called as functions, and names already defined (A, B, X, Y, numpy...) are left alone
+    index=dict(names)
+    for name in defined_names().intersection(index):
+        index.pop(name)
+    try:
+        tree=ast.parse(expr.strip(),mode='eval')
+    except SyntaxError:
+        return expr
+    called=set(id(node.func) for node in ast.walk(tree) if isinstance(node,ast.Call))
+    if not [node for node in ast.walk(tree) if isinstance(node,ast.Name) and node.id in index and id(node) not in called]:
+        return expr
+    class Names(ast.NodeTransformer):
+        def visit_Name(self,node):
+            if node.id in index and id(node) not in called:
+                return ast.parse('A[:,%d]' %index[node.id],mode='eval').body
+            return node
+    return ast.unparse(Names().visit(tree))
+
+def resolve_names(expr,names):
+    # Expression with the column names (dict name:index) replaced by the columns they refer to
+    if not names or not expr:
+        return expr
+    if expr in names and expr not in defined_names():
+        return 'A[:,%d]' %names[expr]
+    return named_expression(expr,tuple(sorted(names.items())))
+
+def column_subscript(node):
+    # i if node is A[:,i] with a constant i>=0, None otherwise
+    if (isinstance(node,ast.Subscript) and isinstance(node.value,ast.Name) and node.value.id=='A'
+            and isinstance(node.slice,ast.Tuple) and len(node.slice.elts)==2):
+        a,b=node.slice.elts
+        if (isinstance(a,ast.Slice) and a.lower is None and a.upper is None and a.step is None
+                and isinstance(b,ast.Constant) and type(b.value) is int and b.value>=0):
+            return b.value
+    return None
+
+@lru_cache(maxsize=None)
+def column_refs(expr):
+    # Indices of the columns A[:,i] used by expression, None if it uses A (or B) in any other way
+    try:
+        tree=ast.parse(expr.strip(),mode='eval')
+    except SyntaxError:
+        return frozenset()
+    refs=set()
+    columns=set()
+    for node in ast.walk(tree):
+        i=column_subscript(node)
+        if i is not None:
+            refs.add(i)
+            columns.add(id(node.value))
+    for node in ast.walk(tree):
+        if isinstance(node,ast.Name) and (node.id=='B' or (node.id=='A' and id(node) not in columns)):
+            return None
+    return frozenset(refs)
+
+@lru_cache(maxsize=None)
+def remap_columns(expr,positions):
+    # Replaces the columns A[:,i] in expression by A[:,j], for (i,j) in positions
+    #  columns that were not loaded are sent out of range
+    index=dict(positions)
+    try:
+        tree=ast.parse(expr.strip(),mode='eval')
+    except SyntaxError:
+        return expr
+    if not [node for node in ast.walk(tree) if column_subscript(node) is not None]:
+        return expr
+    class Columns(ast.NodeTransformer):
+        def visit_Subscript(self,node):
+            i=column_subscript(node)
+            if i is None:
+                return self.generic_visit(node)
+            return ast.parse('A[:,%d]' %index.get(i,len(index)),mode='eval').body
+    return ast.unparse(Columns().visit(tree))
+
+def used_columns(args,names):
+    # Columns of the data file used by the options of a graph, found before loading the data
+    #  returns None if all columns may be needed : rows mode, or data used other than as columns A[:,i]
+    options={'x':'0','y':'1'}
+    for arg in args:
+        key,sep,value=arg.partition('=')
+        if sep and key in ['x','y','dx','dy','if','andif','color','size','mode']:
+            options[key]=value
+    if options.pop('mode','v')!='v':
+        return None
+    columns=set()
+    for key,value in options.items():
+        if not value or value.startswith('aut'):
+            continue
+        if key=='color' and is_color(value):
+            continue
+        if key in ['color','size'] and not (value.isdigit() or value.find('A[')>=0 or resolve_names(value,names)!=value):
+            # a color or a size, not data
+            continue
+        try:
+            i=int(value)
+            if i<0:
+                return None
+            columns.add(i)
+            continue
+        except ValueError:
+            pass
+        refs=column_refs(resolve_names(value,names))
+        if refs is None:
+            return None
+        columns|=refs
+    return sorted(columns)
+
+def uses_names(expr,names):
+    # True if expression expr refers to one of names
+    try:
+        code=compile_expression(expr)
+    except (SyntaxError,ValueError):
+        return False
+    return bool(set(code.co_names) & set(names))
+
 class Toplot:
     # Toplot is a class containing the options for plotting
     #   it also contains a method to split into two
@@ -186,7 +438,7 @@ class Glob:
     # It mostly sorts arguments and prepares global plot options
     def __init__(self, args):
         narg=len(args)
-        if nargs<2:
+        if narg<1:
             self.usage()
         self.out='plot'
         self.xlabel=None
@@ -201,6 +453,7 @@ class Glob:
         self.kdist=0.1
         self.xlog=0
         self.ylog=0
+        self.njobs=None
 
         keyz=''
         future_plots=[]
@@ -231,6 +484,8 @@ class Glob:
                 self.ymax=float(arg[5:])
             elif arg.startswith('key='):
                 keyz=arg[4:]
+            elif arg.startswith('jobs='):
+                self.njobs=int(arg[5:])
             elif arg.startswith('kdist='):
                 self.kdist=arg[6:]
             elif arg.startswith('legend=') or arg.startswith('title'):
@@ -241,6 +496,8 @@ class Glob:
                 self.xlog=1
             elif arg.startswith('-ylog'):
                 self.ylog=1
+            elif arg.startswith('-nocache'):
+                set_cache(enabled=False)
             # Local / semi-local options
             elif arg.startswith('andif'):
                 if has_name==0:
@@ -312,18 +569,73 @@ class Glob:
                 x=xaxis,
                 y=yaxis )
 
-        # We create the graphs
-        self.graphs=[Graph(toplot) for toplot in future_plots]
+        # We load all the files at once, with only the columns that are used, then create the graphs
+        fnames=[toplot.file_name for toplot in future_plots]
+        columns=self.file_columns(future_plots)
+        datas=getdata_files(fnames,self.njobs,[columns[fname] for fname in fnames])
+        self.graphs=[Graph(toplot,data,columns[toplot.file_name]) for toplot,data in zip(future_plots,datas)]
+
+    def file_columns(self,toplots):
+        # columns used by all the graphs of each file, None if all columns are needed
+        columns={}
+        for toplot in toplots:
+            fname=toplot.file_name
+            try:
+                labels=splitheader(fname)
+            except (OSError,ValueError):
+                labels=[]
+            used=used_columns(toplot.args,column_index(labels,len(labels)))
+            if fname not in columns:
+                columns[fname]=used
+            elif used is None or columns[fname] is None:
+                columns[fname]=None
+            else:
+                columns[fname]=sorted(set(columns[fname])|set(used))
+        return columns
 
     def make_plot(self):
+        if [graf for graf in self.graphs if graf.decimate]:
+            xrange=self.axis_range([graf.X for graf in self.graphs],self.xmin,self.xmax,self.xlog)
+            yrange=self.axis_range([graf.Y for graf in self.graphs],self.ymin,self.ymax,self.ylog)
         for graf in self.graphs:
+            if graf.decimate and graf.kind!='density':
+                graf.decimate_points(xrange,yrange,self.width,self.height,self.xlog,self.ylog)
             self.plot(graf)
 
+    def axis_range(self,values,vmin,vmax,log):
+        # range of an axis : from the options, or else from all the data
+        V=concatenate(values)
+        if log:
+            V=V[V>0]
+        V=V[isfinite(V)]
+        if vmin is None:
+            vmin=V.min() if len(V) else 0.0
+        if vmax is None:
+            vmax=V.max() if len(V) else 1.0
+        return (vmin,vmax)
+
     def plot(self,graf):
-        self.graph.plot([graph.data.points([(x,graf.Y[i],graf.dX[i],graf.dY[i],graf.S[i],graf.C[i]) for i, x in enumerate(graf.X[:])], x=1, y=2,dx=3,dy=4,size=5,color=6,title=graf.legend)],graf.style)
+        if graf.kind=='density':
+            # only the extent of the data is plotted, to set the axes ; points are drawn by draw_densities
+            self.graph.plot([graph.data.values(title=graf.legend,**graf.extent(self.xlog,self.ylog))],graf.style)
+            return
+        # columns are handed to PyX as they are, without building one tuple per point
+        self.graph.plot([graph.data.values(title=graf.legend,**graf.columns())],graf.style)
+
+    def draw_densities(self):
+        # density graphs are drawn as bitmaps, once the axes are known
+        denses=[graf for graf in self.graphs if graf.kind=='density']
+        if denses:
+            self.graph.dolayout()
+            xaxis=self.graph.axes['x'].data
+            yaxis=self.graph.axes['y'].data
+            for graf in denses:
+                self.graph.layer('filldata').insert(graf.density_bitmap(self.graph,(xaxis.min,xaxis.max),
+                        (yaxis.min,yaxis.max),self.width,self.height,self.xlog,self.ylog))
 
     def save_plot(self):
         if self.graphs:
+            self.draw_densities()
             if self.out.endswith('.eps'):
                 self.graph.writeEPSfile(self.out)
             elif self.out.endswith('.svg'):
@@ -333,18 +645,13 @@ class Glob:
 
 
     def usage(self):
-        disp('splot is a simple command line plotting tool based on PyX (PyX is awesome !)')
-        disp('---------------------------- Warning : you should use PyX for more options')
-        disp('Examples :')
-        disp('splot.py file.txt')
-        disp('splot.py file.txt color=red file2.txt out=plot.pdf')
-        disp('splot.py file.txt y=A[:,1]^2+A[:,2]^2 dy=3 color=1')
-        quit
+        print(__doc__)
+        sys.exit()
 
 class Graph(Glob):
     # Graph is a class containing a single line/set of points and their style, created from class Toplot
     numr=-1
-    def __init__(self, toplot):
+    def __init__(self, toplot, data=None, columns=None):
         args=toplot.args
         self.file=toplot.file_name
         Graph.numr+=1
@@ -353,6 +660,8 @@ class Graph(Glob):
         self.mode='v'
         self.legend="file %s" %Graph.numr
         self.data=[]
+        self.X=[]
+        self.Y=[]
         self.dX=[]
         self.dY=[]
         self.S=[]
@@ -364,11 +673,22 @@ class Graph(Glob):
         siz=''
         self.cond=[]
         self.range=[]
-        (A,a,b)=getdata(self.file)
-        labels=splitheader(self.file)
+        self.decimate=None
+        if data is None:
+            data=getdata_header(self.file,columns)
+        (A,a,b,labels)=data
+        self.names=column_index(labels,b)
+        # position of the columns of the file in A, if only some columns were loaded
+        self.positions=None
+        if columns is not None:
+            if a==1:
+                # a single line is plotted as rows : all columns are needed
+                (A,a,b,labels)=getdata_header(self.file)
+            else:
+                self.positions=tuple((c,j) for j,c in enumerate(c for c in columns if c<b))
 
         # Dirty tricks for maximum compatibility
-        if min(a,b)==1:
+        if a==1 or b==1:
             self.x='auto'
             self.y=0
         if a==1:
@@ -405,6 +725,8 @@ class Graph(Glob):
                 col=arg[6:]
             elif arg.startswith('size='):
                 siz=arg[5:]
+            elif arg.startswith('decimate='):
+                self.decimate=arg[9:]
 
 
 
@@ -412,14 +734,12 @@ class Graph(Glob):
         if len(self.range):
             A=self.set_A_range(A)
 
-        # We perform a first extraction of X and Y to be able to evalyate conditions on X,Y
-        self.X=self.set_from_input(A,self.x,'x')
-        self.Y=self.set_from_input(A,self.y,'y')
-        self.dX=self.set_from_input(A,self.dx,'dx')
-        self.dY=self.set_from_input(A,self.dy,'dy')
-
         #if (len(self.range) or len(self.cond)):
         if len(self.cond):
+            # A first extraction of X and Y is needed only if the condition is on X,Y
+            if uses_names(self.cond,['X','Y']):
+                self.X=self.set_from_input(A,self.x,'x')
+                self.Y=self.set_from_input(A,self.y,'y')
             A=self.set_A_condition(A)
 
         # Now we perfeorm the definitive extraction of X,Y once A has bne filtered
@@ -429,9 +749,10 @@ class Graph(Glob):
         self.dY=self.set_from_input(A,self.dy,'dy')
 
         # Now we assign colors and size if need be
-        if siz.isdigit() or siz.find('A[')>=0:
+        if siz.isdigit() or siz.find('A[')>=0 or self.expression(siz)!=siz:
             self.S=self.set_from_input(A,siz,'size')
-        if col.isdigit() or col.find('A[')>=0:
+        self.colored=col.isdigit() or col.find('A[')>=0 or (not is_color(col) and self.expression(col)!=col)
+        if self.colored:
             self.C=self.set_from_input(A,col,'color')
 
         if not len(self.C):
@@ -448,20 +769,121 @@ class Graph(Glob):
         elif lY>lX:
             self.Y=self.Y[0:lX]
             lY=lX
+        # error bars are only drawn for the errors that were given
+        self.errors=[name for name,v in [('dx',self.dX),('dy',self.dY)] if len(v)]
         if not len(self.dY):
             self.dY=zeros((lX,1))
         if not len(self.dX):
             self.dX=zeros((lX,1))
 
         # we scale the color scale
-        self.C=(self.C-min(self.C))/(max(self.C)-min(self.C))
+        cmin,cmax=self.C.min(),self.C.max()
+        self.C=(self.C-cmin)/(cmax-cmin)
 
         # we make sure no size is non-positive
-        if min(self.S)<=0:
-            self.S=(self.S-min(self.S))+0.001
+        smin=self.S.min()
+        if smin<=0:
+            self.S=(self.S-smin)+0.001
+
+        # all columns are made contiguous float arrays of the same length
+        self.X,self.Y,self.dX,self.dY,self.S,self.C=[ascontiguousarray(ravel(v)[0:lX],dtype=float)
+                for v in [self.X,self.Y,self.dX,self.dY,self.S,self.C]]
 
         # and now we can make the style !
-        self.style=Style(args).style
+        stil=Style([self.named_option(arg) for arg in args])
+        self.style=stil.style
+        self.kind=stil.goodstyle.kind
+        self.gradient=stil.goodstyle.gradient
+        self.levels=stil.goodstyle.levels
+
+    def columns(self):
+        # the data columns to be plotted by PyX ; color is given as a color level
+        cols={'x':self.X,'y':self.Y,'size':self.S,'color':color_level(self.C,self.levels)}
+        if isinstance(self.style[0],changesymbol):
+            # symbol sizes are given in pt, computed once for all points
+            cols['size']=self.style[0].sizes_pt(self.S)
+        if 'dx' in self.errors:
+            cols['dx']=self.dX
+        if 'dy' in self.errors:
+            cols['dy']=self.dY
+        return cols
+
+    def extent(self,xlog,ylog):
+        # two points spanning the data
+        cols={}
+        for name,V,log in [('x',self.X,xlog),('y',self.Y,ylog)]:
+            V=V[isfinite(V)]
+            if log:
+                V=V[V>0]
+            cols[name]=[V.min(),V.max()] if len(V) else []
+        if not (len(cols['x']) and len(cols['y'])):
+            cols={'x':[],'y':[]}
+        return cols
+
+    def density_bitmap(self,agraph,xrange,yrange,width,height,xlog,ylog):
+        # 2D histogram of the points at the resolution of the figure, as a bitmap
+        nx=int(width*density_dpcm)
+        ny=int(height*density_dpcm)
+        sx=scaled(self.X,xrange,xlog)
+        sy=scaled(self.Y,yrange,ylog)
+        kept=isfinite(sx)&isfinite(sy)
+        H=histogram2d(sx[kept],sy[kept],bins=[nx,ny],range=[[0,1],[0,1]])[0]
+        if H.max()>0:
+            H=log1p(H)/log1p(H.max())
+        pixels=zeros((nx,ny,4),dtype=uint8)
+        pixels[:,:,0:3]=gradient_lut(self.gradient,256)[(H*255).astype(int)]
+        # empty bins are transparent
+        pixels[:,:,3]=255*(H>0)
+        # image rows go from top to bottom
+        pixels=ascontiguousarray(pixels.transpose((1,0,2))[::-1])
+        image=bitmap.image(nx,ny,'RGBA',pixels.tobytes())
+        x0,y0=agraph.vpos_pt(0,0)
+        x1,y1=agraph.vpos_pt(1,1)
+        return bitmap.bitmap_pt(x0,y0,image,width_pt=x1-x0,height_pt=y1-y0)
+
+    def decimate_points(self,xrange,yrange,width,height,xlog,ylog):
+        # removes the points that would not be visible at the size of the figure
+        mode=self.decimate
+        if mode=='auto':
+            if self.kind=='line':
+                mode='minmax'
+            else:
+                mode='thin'
+        sx=scaled(self.X,xrange,xlog)
+        if mode=='minmax':
+            keep=minmax_points(cells(sx,width*decimate_dpcm),self.Y)
+        elif mode=='thin':
+            sy=scaled(self.Y,yrange,ylog)
+            # color levels only matter if color comes from the data
+            keep=thin_points(cells(sx,width/thin_cell),cells(sy,height/thin_cell),cells(self.C,thin_levels*self.colored))
+        else:
+            print('Warning : could not understand decimation from %s' %mode)
+            return
+        self.X,self.Y,self.dX,self.dY,self.S,self.C=[v[keep] for v in [self.X,self.Y,self.dX,self.dY,self.S,self.C]]
+
+    def expression(self,input):
+        # column names of the header are replaced by the columns they refer to,
+        #  and columns by their position among the loaded columns
+        if self.mode=='h' or not input:
+            return input
+        expr=resolve_names(input,self.names)
+        if self.positions is not None:
+            expr=remap_columns(expr,self.positions)
+        return expr
+
+    def column(self,i):
+        # position of column i of the file in the loaded data
+        if self.positions is None:
+            return i
+        return dict(self.positions).get(i,len(self.positions))
+
+    def named_option(self,arg):
+        # color and size options, with column names replaced by the columns they refer to
+        #  a color keeps its meaning, e.g. color=red with a column named red
+        for key in ['color=','size=']:
+            if arg.startswith(key) and not (key=='color=' and is_color(arg[len(key):])):
+                return key+self.expression(arg[len(key):])
+        return arg
 
     def set_from_input(self,A,input,coord):
         # We first check if axis defined by a row/column number
@@ -470,7 +892,7 @@ class Graph(Glob):
             if self.mode=='h':
                 return A[i,:]
             else:
-                return A[:,i]
+                return A[:,self.column(i)]
         except:
             if input:
                 # Automatic axis value : 1 to length of array
@@ -481,7 +903,7 @@ class Graph(Glob):
                         return array(range(len(A[:,0])))
                 # Interpreting axis value
                 try:
-                    return eval(input)
+                    return evaluate(self.expression(input),{'A':A})
                 except:
                     print('We could note evaluate %s from %s' %(coord,input))
                 return []
@@ -525,10 +947,8 @@ class Graph(Glob):
             B=A.copy()
 
         if len(self.cond)>0:
-            X=self.X
-            Y=self.Y
             try:
-                kept=eval(self.cond)
+                kept=evaluate(self.expression(self.cond),{'A':A,'B':B,'X':self.X,'Y':self.Y})
                 if self.mode=='h':
                     B=B[kept]
                     A=B.transpose()
@@ -539,6 +959,56 @@ class Graph(Glob):
 
         return A
 
+def scaled(V,vrange,log):
+    # position of values along an axis, from 0 to 1
+    with errstate(divide='ignore',invalid='ignore'):
+        if log:
+            return (log10(V)-log10(vrange[0]))/(log10(vrange[1])-log10(vrange[0]))
+        return (V-vrange[0])/(vrange[1]-vrange[0])
+
+@lru_cache(maxsize=None)
+def gradient_colors(gradient,levels):
+    # colors of a gradient at regularly spaced levels
+    return [gradient.getcolor(i/(levels-1.0)) for i in range(levels)]
+
+@lru_cache(maxsize=None)
+def gradient_lut(gradient,levels):
+    # rgb values (0-255) of a gradient at regularly spaced levels
+    lut=zeros((levels,3),dtype=uint8)
+    for i,col in enumerate(gradient_colors(gradient,levels)):
+        rgb=col.rgb()
+        lut[i]=[int(255*rgb.r+0.5),int(255*rgb.g+0.5),int(255*rgb.b+0.5)]
+    return lut
+
+def color_level(C,levels):
+    # index of the closest color level of values from 0 to 1 ; undefined values get level 0
+    L=nan_to_num(C*(levels-1)+0.5,nan=0.0,posinf=levels-1,neginf=0.0)
+    return clip(L,0,levels-1).astype(int)
+
+def cells(S,n):
+    # index of the cell of scaled values among n cells ; -1 and n out of range, -2 if undefined
+    C=floor(nan_to_num(S*n,nan=-2.0,posinf=n,neginf=-1.0))
+    return clip(C,-2,n).astype(int)
+
+def minmax_points(B,Y):
+    # indices of the first, last, min and max points of each run of points within the same cell
+    n=len(B)
+    if n<5:
+        return arange(n)
+    run=concatenate(([0],cumsum(B[1:]!=B[0:-1])))
+    starts=searchsorted(run,arange(run[-1]+1))
+    ends=concatenate((starts[1:],[n]))-1
+    # within each run, points sorted by Y
+    order=lexsort((Y,run))
+    return unique(concatenate((starts,ends,order[starts],order[ends])))
+
+def thin_points(BX,BY,BC):
+    # indices of the last point drawn in each cell and color level
+    n=len(BX)
+    keys=stack((BX,BY,BC),1)[::-1]
+    last=n-1-unique(keys,axis=0,return_index=True)[1]
+    return sort(last)
+
 class Style(Graph):
     # A class containing the style to make a graph
     def __init__(self, args):
@@ -560,6 +1030,10 @@ class Style(Graph):
             else:
                 self.style=[changesymbol(**vars(self.goodstyle)),graph.style.errorbar(errorbarattrs=self.dxy)]
 
+        elif self.goodstyle.kind=='density':
+            # an invisible symbol : the points are drawn as a bitmap
+            self.style=[graph.style.symbol(symbolattrs=None)]
+
         elif self.goodstyle.kind=='line':
             if not len(self.dxy):
                 self.style=[graph.style.line([self.goodstyle.linest,self.goodstyle.linew,self.goodstyle.setcolor]),graph.style.errorbar(False)]
@@ -576,6 +1050,7 @@ class goodstyle(Style):
         self.linew=style.linewidth.thin
         self.linest=linests[count %4]
         self.gradient=color.gradient.Rainbow;
+        self.levels=color_levels
 
         for arg in args:
             if arg.startswith('color='):
@@ -616,6 +1091,15 @@ class goodstyle(Style):
                     except:
                         print('Warning : could not understand gradient from %s' %grad)
 
+            elif arg.startswith('levels='):
+                lev=arg[7:]
+                try:
+                    self.levels=int(lev)
+                    if self.levels<2:
+                        self.levels=2
+                except:
+                    print('Warning : could not understand levels from %s' %lev)
+
             elif arg.startswith('size='):
                 siz=arg[5:]
                 if siz.find('A[')>=0:
@@ -641,6 +1125,9 @@ class goodstyle(Style):
                 except:
                     print('Warning : could not understand line width from %s' %lin)
 
+            elif arg=='style=density':
+                self.kind='density'
+
             elif arg.startswith('style='):
                 stil=arg[6:]
                 try:
@@ -667,12 +1154,13 @@ class changesymbol(graph.style.symbol):
                        symbol=graph.style.symbol.triangle,
                        symbolattrs=[deco.filled, deco.stroked],
                        setsize=0.5,kind='symbol',linew=False,linest=False,
-                       setcolor=color.gray(0.0),
+                       setcolor=color.gray(0.0),levels=color_levels,
                        **kwargs):
         # add some configuration parameters and modify some other
         self.sizecolumnname = sizecolumnname
         self.colorcolumnname = colorcolumnname
         self.gradient = gradient
+        self.levels = levels
         self.setsize = setsize
         self.setcolor = setcolor
         if self.setcolor:
@@ -689,26 +1177,45 @@ class changesymbol(graph.style.symbol):
                 graph.style.symbol.columnnames(self, privatedata, sharedata, agraph,
                                                columnnames, dataaxisnames))
 
+    def selectstyle(self, privatedata, sharedata, agraph, selectindex, selecttotal):
+        graph.style.symbol.selectstyle(self, privatedata, sharedata, agraph, selectindex, selecttotal)
+        # attributes are made once per color level, and shared by all the points of that level
+        if privatedata.symbolattrs is not None:
+            if self.setcolor:
+                privatedata.levelattrs = [privatedata.symbolattrs + [self.setcolor]]*self.levels
+            else:
+                privatedata.levelattrs = [privatedata.symbolattrs + [col] for col in gradient_colors(self.gradient,self.levels)]
+        privatedata.setsize_pt = privatedata.size_pt*self.setsize
+
+    def sizes_pt(self, S):
+        # sizes of the symbols in pt, from the size column S
+        if self.setsize<0:
+            return S*unit.topt(self.size)
+        return S
+
     def drawpoint(self, privatedata, sharedata, graph, point):
         # replace the original drawpoint method by a slightly revised one
         if sharedata.vposvalid and privatedata.symbolattrs is not None:
             x_pt, y_pt = graph.vpos_pt(*sharedata.vpos)
             if self.setsize<0:
-                siz=privatedata.size_pt*point[self.sizecolumnname]
+                siz=point[self.sizecolumnname]
             else :
-                siz=privatedata.size_pt*self.setsize
-            if     self.setcolor:
-                color= self.setcolor
-            else:
-                color = self.gradient.getcolor(point[self.colorcolumnname])
-            col =privatedata.symbolattrs + [color]
-            privatedata.symbol(privatedata.symbolcanvas, x_pt, y_pt, siz, col)
-
+                siz=privatedata.setsize_pt
+            privatedata.symbol(privatedata.symbolcanvas, x_pt, y_pt, siz, privatedata.levelattrs[point[self.colorcolumnname]])
+
+
+def main(args):
+    # styles are numbered from the first graph of each figure
+    Graph.numr=-1
+    # options such as -nocache only apply to this figure, also in a long-lived process (splotd)
+    import import_tools
+    enabled=import_tools.use_cache
+    try:
+        glob=Glob(args)
+        glob.make_plot()
+        glob.save_plot()
+    finally:
+        set_cache(enabled=enabled)
 
 if __name__ == "__main__":
-    nargs=len(sys.argv);
-    args=sys.argv[1:];
-
-    glob=Glob(args)
-    glob.make_plot()
-    glob.save_plot()
+    main(sys.argv[1:])
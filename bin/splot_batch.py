@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Serge Dmitrieff
+# www.biophysics.fr
+
+"""
+# SYNOPSIS
+
+   splot_batch renders many splot figures from a manifest, in a single run
+
+# DESCRIPTION
+
+   Each line of the manifest holds the arguments of one splot.py figure, as on the command line
+   (quotes are understood, lines starting with # are ignored).
+   Data files used by several figures are loaded only once,
+   and figures are rendered by a pool of processes. The time spent on each figure is reported.
+
+# SYNTAX
+
+   python splot_batch.py MANIFEST [jobs=N]
+
+# OPTIONS
+
+    jobs     : number of processes (default : number of cores)
+
+# EXAMPLES :
+
+            splot_batch.py figures.txt jobs=8
+                    with figures.txt containing for instance :
+                        run1/data.txt x=0 y=5 out=length.pdf
+                        run1/data.txt x=0 y=7 'if=A[:,7]>0' out=speed.pdf
+"""
+
+import sys
+import os
+import shlex
+import time
+import splot
+from import_tools import getdata_files, set_cache
+
+def read_manifest(fname):
+    figures=[]
+    f=open(fname,'r')
+    for line in f:
+        line=line.strip()
+        if line and not line.startswith('#'):
+            figures.append(shlex.split(line))
+    f.close()
+    return figures
+
+def data_files(args):
+    # the arguments that Glob understands as file names
+    return [arg for arg in args if not (arg.startswith('-') or arg.find('=')>=0 or arg=='and')]
+
+def render(job):
+    n,args=job
+    t0=time.perf_counter()
+    try:
+        splot.main(args)
+        message=''
+    except SystemExit as e:
+        # e.g. help or bad arguments : only this figure fails, the worker goes on
+        message='exit status %s' %(e.code or 0)
+    except Exception as e:
+        message=repr(e)
+    return n,time.perf_counter()-t0,message
+
+def main(args):
+    manifest=None
+    njobs=os.cpu_count() or 1
+    for arg in args:
+        if arg.startswith('jobs='):
+            njobs=int(arg[5:])
+        else:
+            manifest=arg
+    if manifest is None:
+        print(__doc__)
+        return 1
+    figures=read_manifest(manifest)
+    t0=time.perf_counter()
+
+    # every data file is loaded once, before workers are forked
+    files=[]
+    for figure in figures:
+        files+=[fname for fname in data_files(figure) if fname not in files]
+    set_cache(memory=len(files))
+    getdata_files(files,njobs)
+    print('Loaded %s data files in %.2f s' %(len(files),time.perf_counter()-t0))
+
+    jobs=list(enumerate(figures))
+    if njobs>len(jobs):
+        njobs=len(jobs)
+    if njobs>1:
+        from multiprocessing import Pool
+        pool=Pool(njobs)
+        try:
+            results=pool.imap(render,jobs)
+            failed=report(results,figures)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        failed=report(map(render,jobs),figures)
+    print('Rendered %s figures in %.2f s' %(len(figures),time.perf_counter()-t0))
+    return failed
+
+def report(results,figures):
+    failed=0
+    for n,duration,message in results:
+        line=' '.join(figures[n])
+        if message:
+            failed=1
+            print('%.3f s : FAILED %s (%s)' %(duration,line,message))
+        else:
+            print('%.3f s : %s' %(duration,line))
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
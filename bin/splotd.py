@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Serge Dmitrieff
+# www.biophysics.fr
+
+"""
+# SYNOPSIS
+
+   splotd is a persistent splot server, and its client
+
+# DESCRIPTION
+
+   The server keeps python, PyX (and its TeX process) and recently loaded data in memory,
+   so that each plot only costs the plotting itself.
+   The client takes exactly the same arguments as splot.py ; it only imports the python standard library.
+   If no server is running, the client plots by itself.
+
+# SYNTAX
+
+   python splotd.py --start             : starts a server in the background
+   python splotd.py --serve             : runs a server in the foreground
+   python splotd.py --stop              : stops the server
+   python splotd.py SPLOT_ARGUMENTS     : plots through the server
+
+   The server socket is SPLOT_SOCKET if defined, splot.sock in XDG_RUNTIME_DIR otherwise,
+   or else in a private folder splot-UID of the temporary folder (e.g. /tmp/splot-UID/splot.sock)
+
+# EXAMPLES :
+
+            splotd.py --start
+            splotd.py file.txt x=3 y=7 out=plot.pdf
+"""
+
+import sys
+import os
+import json
+import socket
+import stat
+import time
+
+# Number of data files kept in memory by the server
+memory_files=64
+
+def private_dir():
+    # folder splot-UID of the temporary folder, only accessible to the user
+    import tempfile
+    path=os.path.join(tempfile.gettempdir(),'splot-%s' %os.getuid())
+    try:
+        os.mkdir(path,0o700)
+    except FileExistsError:
+        pass
+    st=os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid!=os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('%s is not a private folder' %path)
+    return path
+
+def socket_path():
+    if 'SPLOT_SOCKET' in os.environ:
+        return os.environ['SPLOT_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'],'splot.sock')
+    return os.path.join(private_dir(),'splot.sock')
+
+def receive(conn):
+    chunks=[]
+    while True:
+        chunk=conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b''.join(chunks).decode())
+
+def send(conn,message):
+    conn.sendall(json.dumps(message).encode())
+    conn.shutdown(socket.SHUT_WR)
+
+def request(message,path=None):
+    # sends a request to the server, returns its answer
+    conn=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+        conn.connect(path or socket_path())
+        send(conn,message)
+        return receive(conn)
+    finally:
+        conn.close()
+
+def running(path):
+    # true if a server answers on path
+    try:
+        return request({'ping':1},path)['status']==0
+    except (OSError,ValueError,KeyError):
+        return False
+
+def plot(args,cwd):
+    # runs splot in folder cwd ; returns the exit status and what was printed
+    import io
+    import traceback
+    import contextlib
+    import splot
+    out=io.StringIO()
+    status=0
+    here=os.getcwd()
+    os.chdir(cwd)
+    try:
+        with contextlib.redirect_stdout(out):
+            splot.main(args)
+    except SystemExit as e:
+        status=e.code or 0
+    except Exception:
+        out.write(traceback.format_exc())
+        status=1
+    finally:
+        os.chdir(here)
+    return status,out.getvalue()
+
+def serve(path=None):
+    # requests are processed one at a time : each may change the working directory
+    # returns 1 if the socket cannot be used
+    try:
+        path=path or socket_path()
+        if os.path.lexists(path):
+            if running(path):
+                sys.stderr.write('Error : a splot server is already running on %s\n' %path)
+                return 1
+            # left by a server that did not stop properly
+            os.remove(path)
+        server=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        # the socket is created readable by the user only
+        umask=os.umask(0o177)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+    except OSError as e:
+        sys.stderr.write('Error : could not use socket %s (%s)\n' %(path,e))
+        return 1
+    # splot, and with it numpy and PyX, is imported once here rather than by the first request
+    import importlib
+    importlib.import_module('splot')
+    from import_tools import set_cache
+    set_cache(memory=memory_files)
+    try:
+        while True:
+            conn,addr=server.accept()
+            try:
+                message=receive(conn)
+                if not isinstance(message,dict):
+                    raise ValueError('not a JSON object')
+                if message.get('stop'):
+                    send(conn,{'status':0,'output':''})
+                    break
+                if message.get('ping'):
+                    send(conn,{'status':0,'output':''})
+                    continue
+                args,cwd=message['args'],message['cwd']
+                if not (isinstance(args,list) and all(isinstance(a,str) for a in args) and isinstance(cwd,str)):
+                    raise ValueError('args should be a list of strings, and cwd a string')
+                t0=time.perf_counter()
+                status,output=plot(args,cwd)
+                send(conn,{'status':status,'output':output,'time':time.perf_counter()-t0})
+            except Exception as e:
+                # a bad request only fails its own connection
+                sys.stderr.write('Warning : bad request (%s)\n' %repr(e))
+            finally:
+                conn.close()
+    finally:
+        server.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return 0
+
+def start(path=None):
+    # starts a detached server and waits until it answers
+    try:
+        path=path or socket_path()
+    except OSError as e:
+        sys.stderr.write('Error : no socket for the splot server (%s)\n' %e)
+        return 1
+    if running(path):
+        return 0
+    import subprocess
+    server=subprocess.Popen([sys.executable,os.path.abspath(__file__),'--serve'],
+            stdin=subprocess.DEVNULL,stdout=subprocess.DEVNULL,start_new_session=True)
+    for i in range(100):
+        if running(path):
+            return 0
+        if server.poll() is not None:
+            break
+        time.sleep(0.1)
+    sys.stderr.write('Error : splot server did not start\n')
+    return 1
+
+def client(args):
+    try:
+        answer=request({'args':args,'cwd':os.getcwd()})
+    except (OSError,ValueError):
+        # no server : plotting here
+        status,output=plot(args,os.getcwd())
+        answer={'status':status,'output':output}
+    sys.stdout.write(answer['output'])
+    return answer['status']
+
+if __name__ == "__main__":
+    args=sys.argv[1:]
+    if not args or args[0]=='--help':
+        print(__doc__)
+    elif args[0]=='--serve':
+        sys.exit(serve())
+    elif args[0]=='--start':
+        sys.exit(start())
+    elif args[0]=='--stop':
+        try:
+            request({'stop':1})
+        except OSError:
+            sys.stderr.write('Warning : no splot server running\n')
+    else:
+        sys.exit(client(args))
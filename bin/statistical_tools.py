@@ -1,6 +1,8 @@
 ####### START : PACKAGES
-import math
-from numpy import *
+import os
+from numpy import (amax, amin, append, arange, argmin, array, asarray, block, dot, empty, float64, ix_,
+                   linalg, max, maximum, mean, min, minimum, nan, ndarray, ones, outer, prod, ravel, sum,
+                   var, zeros)
 ####### END  : PACKAGES
 
 ######## START : Developper's notes
@@ -9,37 +11,148 @@ from numpy import *
 ######## END : Developper's notes
 
     
-def array_regression(XX,*args):
+def array_regression(XX,*args,njobs=1):
+    # njobs : number of processes for 3D arrays (None : all cores)
     sx=XX.shape
     if len(sx)<3:
         return array2_regression(XX,*args)
     else:
+        if njobs is None:
+            njobs=os.cpu_count() or 1
+        if njobs>sx[2]:
+            njobs=sx[2]
+        if njobs>1:
+            return parallel_array_regression(XX,njobs,*args)
         results=zeros((sx[1],sx[1],sx[2]))
         for i in range(sx[2]):
             results[:,:,i]=array2_regression(XX[:,:,i],*args)
         return results
     return []
 
+# Shared arrays of the worker processes of parallel_array_regression
+_shared={}
+
+def _attach_shared(xname,xshape,rname,rshape,args):
+    from multiprocessing import shared_memory
+    xmem=shared_memory.SharedMemory(name=xname)
+    rmem=shared_memory.SharedMemory(name=rname)
+    _shared['mems']=[xmem,rmem]
+    _shared['X']=ndarray(xshape,dtype=float64,buffer=xmem.buf)
+    _shared['results']=ndarray(rshape,dtype=float64,buffer=rmem.buf)
+    _shared['args']=args
+
+def _regression_slice(i):
+    _shared['results'][:,:,i]=array2_regression(_shared['X'][i],*_shared['args'])
+
+## Runs array2_regression on each XX[:,:,i] with njobs processes
+# the data and results are in shared memory : slices are never pickled
+def parallel_array_regression(XX,njobs,*args):
+    from multiprocessing import Pool, shared_memory
+    sx=XX.shape
+    xshape=(sx[2],sx[0],sx[1])
+    rshape=(sx[1],sx[1],sx[2])
+    xmem=shared_memory.SharedMemory(create=True,size=int(8*prod(xshape)) or 8)
+    rmem=shared_memory.SharedMemory(create=True,size=int(8*prod(rshape)) or 8)
+    try:
+        # slices are stored contiguously
+        X=ndarray(xshape,dtype=float64,buffer=xmem.buf)
+        X[:]=XX.transpose((2,0,1))
+        shared=ndarray(rshape,dtype=float64,buffer=rmem.buf)
+        shared[:]=0
+        pool=Pool(njobs,initializer=_attach_shared,initargs=(xmem.name,xshape,rmem.name,rshape,args))
+        try:
+            for done in pool.imap_unordered(_regression_slice,range(sx[2]),chunksize=1+sx[2]//(4*njobs)):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+        results=shared.copy()
+        del X,shared
+    finally:
+        xmem.close()
+        xmem.unlink()
+        rmem.close()
+        rmem.unlink()
+    return results
+
 
 def array2_regression(XX,*args):
     sx=XX.shape
     if len(sx)!=2:
         raise ValueError('Incorrect format for input data')
-    nx=sx[1]
+    ny,nx=sx
+    # nimp is the number of 'important' fitting parameters
+    if len(args)>0:
+        nimp=args[0]
+    else:
+        nimp=min((ny,nx-1))
 
     results=zeros((nx,nx))
+    if ny>nimp+1:
+        # All regressions share the same centered Gram matrix
+        Xc=XX-mean(XX,0)
+        G=dot(Xc.T,Xc)
+        chosable=var(XX,0)!=0
     for i in range(nx):
         mask=ravel(ones((1,nx),dtype=bool))
         mask[i]=False
-        res=multilinear_regression(XX[:,i],XX[:,mask],*args)[0]
-        results[i,mask]=res
+        res=None
+        if ny>nimp+1:
+            res=gram_regression(G,i,mask*chosable,nimp)
+        if res is None:
+            res=multilinear_regression(XX[:,i],XX[:,mask],*args)[0]
+            results[i,mask]=res
+        else:
+            results[i,:]=res[0]
 
     return results
 
+## Greedy regression of column iy of a dataset from its centered Gram matrix G
+# Same predictor selection as multilinear_regression, choosing from the columns in mask
+# The inverse Gram matrix of the chosen predictors is updated by bordering at each step
+# Returns the coefficients for all columns (0 if not chosen), the chosen columns
+#   and the residual sum of squares after each choice,
+#   or None if the chosen predictors are degenerate
+def gram_regression(G,iy,mask,nimp):
+    nvx=sum(mask)
+    if nimp>nvx:
+        nimp=nvx
+        print('Warning : changing predictor number to number of variables')
+    left=arange(len(mask))[mask]
+    Gyy=G[iy,iy]
+    hist=ravel(zeros((1,nimp),int))
+    Ginv=zeros((0,0))
+    coefs=zeros(0)
+    rss=Gyy
+    rsss=zeros(nimp)
+    for ni in range(nimp):
+        # correlation of the current residual with each remaining column
+        cors=G[left,iy]-dot(G[ix_(left,hist[0:ni])],coefs)
+        scores=rss-cors**2/G[left,left]
+        rk=argmin(scores)
+        ix=left[rk]
+        # bordering update of the inverse Gram matrix
+        b=G[hist[0:ni],ix]
+        u=dot(Ginv,b)
+        schur=G[ix,ix]-dot(b,u)
+        if schur<=1e-10*G[ix,ix]:
+            return None
+        Ginv=block([[Ginv+outer(u,u)/schur,-u[:,None]/schur],[-u[None,:]/schur,ones((1,1))/schur]])
+        hist[ni]=ix
+        coefs=dot(Ginv,G[hist[0:ni+1],iy])
+        rss=Gyy-dot(G[iy,hist[0:ni+1]],coefs)
+        rsss[ni]=rss
+        left=left[arange(len(left))!=rk]
+    res=zeros(len(mask))
+    res[hist]=coefs
+    return res,hist,rsss
+
 ## Regression for Y as of XX
 # Identify best predictors
 # also returns order of predictors
-def multilinear_regression(Y,XX,*args):
+# scoring : 'closed' scores all candidate predictors in one expression at each step,
+#           'lstsq' fits each candidate separately (slower, same result)
+def multilinear_regression(Y,XX,*args,scoring='closed'):
     sy=Y.shape
     sx=XX.shape
     # nimp is the number of 'important' fitting parameters
@@ -101,16 +214,27 @@ def multilinear_regression(Y,XX,*args):
     YY=Y-ravel(M)*cte
     # baseline error
     err0=sum(dy)
+    if scoring=='closed' and ny>2:
+        # centered columns of X and their norms, for the closed-form scores
+        Xc=X-mean(X,0)
+        norms=sum(Xc**2,0)
+    elif scoring not in ['closed','lstsq']:
+        raise ValueError('Unknown scoring %s' %scoring)
     # We find best to worst predictor in X
     for ni in range(nimp):
         nvx=sum(left_ix)
-        scores=ones((1,nvx))
-        # computing errors for all rows of X
-        for j in range(nvx):
-            vec=array([0,left[j]])
-            M=X[:,vec]
-            coefs,dy=linalg.lstsq(M,YY,rcond=0)[:2]
-            scores[0,j]=sum(dy)
+        if scoring=='closed' and ny>2:
+            # error of regressing YY on [1,X[:,j]], for all remaining j at once
+            YYc=YY-mean(YY)
+            scores=dot(YYc,YYc)-dot(YYc,Xc[:,left])**2/norms[left]
+        else:
+            scores=ones((1,nvx))
+            # computing errors for all rows of X
+            for j in range(nvx):
+                vec=array([0,left[j]])
+                M=X[:,vec]
+                coefs,dy=linalg.lstsq(M,YY,rcond=0)[:2]
+                scores[0,j]=sum(dy)
         # finding smallest errors
         rk=argmin(scores)
         ix=left[rk]
@@ -134,3 +258,79 @@ def multilinear_regression(Y,XX,*args):
         res[1:]=res[1:]-res[0:(nimp-1)]
     Rsq[hist]=res
     return linco,offset,Rsq,hist
+
+
+## Accumulates the sufficient statistics of a regression of Y as of XX by blocks of rows
+# so that memory does not depend on the number of observations, e.g.
+#   acc=RegressionAccumulator()
+#   for block in iterdata(fname):
+#       acc.add(block[:,0],block[:,1:])
+#   linco,offset,Rsq,hist=acc.regression()
+# regression returns the same as multilinear_regression on the concatenated blocks
+class RegressionAccumulator:
+    def __init__(self):
+        self.n=0
+        self.means=None
+        self.G=None
+        self.mins=None
+        self.maxs=None
+
+    def add(self,Y,XX):
+        Y=ravel(Y)
+        XX=asarray(XX,dtype=float)
+        if len(XX.shape)==1:
+            XX=XX.reshape((len(Y),1))
+        if XX.shape[0]!=len(Y):
+            raise ValueError('X should be a matrix with as many rows as Y has elements')
+        nb=len(Y)
+        if not nb:
+            return
+        # columns of X, then Y
+        Z=empty((nb,XX.shape[1]+1))
+        Z[:,:-1]=XX
+        Z[:,-1]=Y
+        means=mean(Z,0)
+        Zc=Z-means
+        G=dot(Zc.T,Zc)
+        if self.G is None:
+            self.n=nb
+            self.means=means
+            self.G=G
+            self.mins=amin(Z,0)
+            self.maxs=amax(Z,0)
+            return
+        if G.shape!=self.G.shape:
+            raise ValueError('All blocks should have the same number of columns')
+        # merging centered statistics (Chan et al.)
+        delta=means-self.means
+        ntot=self.n+nb
+        self.G=self.G+G+outer(delta,delta)*(self.n*nb/ntot)
+        self.means=self.means+delta*(nb/ntot)
+        self.n=ntot
+        self.mins=minimum(self.mins,amin(Z,0))
+        self.maxs=maximum(self.maxs,amax(Z,0))
+
+    def regression(self,*args):
+        if self.G is None:
+            raise ValueError('No data was accumulated')
+        nx=self.G.shape[0]-1
+        # nimp is the number of 'important' fitting parameters
+        if len(args)>0:
+            nimp=args[0]
+        else:
+            nimp=min((self.n,nx))
+        # predictors without variance cannot be chosen
+        chosable=self.mins[:-1]<self.maxs[:-1]
+        fit=gram_regression(self.G,nx,append(chosable,False),nimp)
+        if fit is None:
+            raise ValueError('Predictors are degenerate')
+        coefs,hist,res=fit
+        linco=coefs[:-1]
+        offset=self.means[-1]-dot(linco,self.means[:-1])
+        res=1.0-res/self.G[nx,nx]
+        # we compute how much each column of X contributes to decreasing the variance
+        if len(hist)>1:
+            res[1:]=res[1:]-res[0:-1]
+        Rsq=nan*ravel(zeros((nx,1)))
+        Rsq[hist]=res
+        return linco,offset,Rsq,hist
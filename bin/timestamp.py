@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# timestamp.py
+#
+# Serge Dmitrieff 2018
+# www.biophysics.fr
+
+"""
+    Add the time to images according to their file number
+
+Syntax:
+
+    timestamp.py [-p prefix] [-m multiplier] [-e extension] [-o outfile] [-s string size] [-x x] [-y y] [-t text]
+                 [-c text columns] [-d folder] [-j jobs]
+
+    -p   : prefix of image files, followed by the frame number (default : none)
+    -m   : multiplier from the frame number to the time (default 1.0)
+    -e   : extension of image files (default .png)
+    -o   : prefix of labeled images, followed by the file name without prefix (default labeled)
+    -s   : font size, in pixels (default 50)
+    -x   : position of the text from the left, in pixels (default 70)
+    -y   : position of the text baseline from the top, in pixels (default 740)
+    -t   : unit of time, written after the time (default s)
+    -c   : width of the time, padded with zeros (default 5)
+    -d   : folder of the images (default : current folder) ; labeled images are written in the current folder
+    -j   : number of images processed in parallel (default : number of cores)
+
+    Images are labeled by python (PIL) if available, by ImageMagick's convert otherwise.
+
+Example:
+
+    timestamp.py -p movie -m 0.03
+"""
+
+try:
+    import sys, os, subprocess
+    from import_tools import index_files
+except ImportError:
+    sys.stderr.write("Error: could not load necessary python modules\n")
+    sys.exit()
+
+out = sys.stderr
+# option letters and their default values
+defaults = {'p': '', 'm': '1.0', 'e': '.png', 'o': 'labeled', 's': '50', 'x': '70', 'y': '740', 't': 's', 'c': '5',
+            'd': '.', 'j': ''}
+
+#------------------------------------------------------------------------
+
+def make_label(number, multiplier, unit, width):
+    """
+    text written on frame number : the time, with the decimals of multiplier, padded with zeros
+    """
+    decimals = 0
+    if multiplier.find('.') >= 0:
+        decimals = len(multiplier)-multiplier.find('.')-1
+    value = '%.*f' % (decimals, number*float(multiplier))
+    return 't=' + value.rjust(width, '0') + unit
+
+
+_fonts = {}
+
+def get_font(size):
+    from PIL import ImageFont
+    if size not in _fonts:
+        try:
+            _fonts[size] = ImageFont.truetype('DejaVuSans.ttf', size)
+        except OSError:
+            _fonts[size] = ImageFont.load_default(size)
+    return _fonts[size]
+
+
+def annotate(job):
+    """
+    write a copy of an image with a label, return an error message if it failed
+    """
+    fname, out_name, label, size, x, y = job
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        # no PIL : each image is labeled by ImageMagick
+        cmd = ['convert', fname, '-fill', 'white', '-pointsize', str(size), '-annotate', '+%i+%i' % (x, y), label,
+               out_name]
+        try:
+            if subprocess.call(cmd):
+                return 'convert failed on %s' % fname
+        except OSError as e:
+            return 'could not run convert (%s)' % e
+        return ''
+    try:
+        image = Image.open(fname)
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        ImageDraw.Draw(image).text((x, y), label, fill='white', font=get_font(size), anchor='ls')
+        image.save(out_name)
+    except (OSError, ValueError) as e:
+        return 'could not label %s (%s)' % (fname, e)
+    return ''
+
+
+def make_jobs(opts):
+    """
+    yield the images to label, in the order of their frame number
+    """
+    for number, name in index_files(opts['p'], opts['e'], opts['d']).liste():
+        label = make_label(number, opts['m'], opts['t'], int(opts['c']))
+        out_name = opts['o'] + name.replace(opts['p'], '', 1)
+        yield (os.path.join(opts['d'], name), out_name, label, int(opts['s']), int(opts['x']), int(opts['y']))
+
+
+def main(args):
+    """
+        read command line arguments and label images
+    """
+    opts = dict(defaults)
+    while args:
+        if len(args) < 2 or not args[0].startswith('-') or args[0][1:] not in opts:
+            out.write("Error: unexpected argument `%s'\n" % args[0])
+            return 1
+        opts[args[0][1:]] = args[1]
+        args = args[2:]
+
+    njobs = int(opts['j'] or os.cpu_count() or 1)
+    jobs = make_jobs(opts)
+    failed = 0
+    done = 0
+    if njobs > 1:
+        from multiprocessing import Pool
+        pool = Pool(njobs)
+        results = pool.imap(annotate, jobs, 16)
+    else:
+        pool = None
+        results = map(annotate, jobs)
+    try:
+        for message in results:
+            done += 1
+            if message:
+                failed += 1
+                out.write("Error: %s\n" % message)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    out.write("%i images labeled, %i failed\n" % (done-failed, failed))
+    if failed:
+        return 3
+    return 0
+
+#------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and (sys.argv[1]=='help' or sys.argv[1]=='--help'):
+        print(__doc__)
+    else:
+        sys.exit(main(sys.argv[1:]))